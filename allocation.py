@@ -0,0 +1,38 @@
+def deck_priorities(decks, owned):
+    """Return deck numbers ordered from closest to complete to furthest, against the whole collection.
+
+    `owned` maps each card key to the copies owned. Decks that need the
+    fewest extra copies come first, so shared cards go to the decks they can
+    finish.
+    """
+    def missing(number):
+        return sum(max(0, quantity - owned.get(key, 0)) for key, (quantity, _) in decks[number].cards.items())
+
+    return sorted(range(len(decks)), key=lambda number: (missing(number), decks[number].name))
+
+
+def allocate_copies(card_index, owned, priority):
+    """Assign owned copies of each card to the decks that use it.
+
+    `card_index` is the inverted index {key: [(deck number, quantity), ...]},
+    `owned` maps keys to owned copies and `priority` lists deck numbers in
+    the order they should be served. Returns {key: {deck number: allocated copies}}.
+
+    Copies of one card can only fill demand for that card, so the flow
+    network behind this problem splits into one independent star per card.
+    Filling each star up to its supply minimises total missing cards (and
+    total missing cost, as every copy of a card has the same price) however
+    the copies are spread. The decks' priority order only decides which
+    optimal solution is returned.
+    """
+    rank = {number: position for position, number in enumerate(priority)}
+    allocation = {}
+    for key, users in card_index.items():
+        remaining = owned.get(key, 0)
+        allocated = {}
+        for number, quantity in sorted(users, key=lambda user: rank[user[0]]):
+            copies = min(quantity, remaining)
+            allocated[number] = copies
+            remaining -= copies
+        allocation[key] = allocated
+    return allocation
@@ -0,0 +1,124 @@
+import asyncio
+import functools
+import logging
+import time
+import urllib.parse
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limit import DEFAULT_DEADLINE
+
+MAX_PER_HOST = 6  # In-flight requests allowed against a single host
+DEFAULT_CONCURRENCY = 8
+
+ScrapeResult = namedtuple("ScrapeResult", ["name", "ok", "elapsed", "error", "status", "retryable", "slug"],
+                          defaults=[None, False, None])
+
+
+class _Progress:
+    """Counts finished commanders so each one can be logged as [done/total]."""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+
+    def report(self, result):
+        self.done += 1
+        if result.ok:
+            logging.info(f"[{self.done}/{self.total}] {result.name}: done in {result.elapsed:.2f}s")
+        else:
+            logging.warning(f"[{self.done}/{self.total}] {result.name}: FAILED in {result.elapsed:.2f}s ({result.error})")
+
+
+async def _scrape_one(name, url, fetch, process_page, ctx):
+    """Fetch one page under its host's limit, then hand it to the processing stage."""
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    host = urllib.parse.urlsplit(url).netloc
+    semaphore = ctx["host_limits"].setdefault(host, asyncio.Semaphore(ctx["max_per_host"]))
+    status, retryable = None, False
+
+    try:
+        async with semaphore:
+            logging.info(f"Fetching data from: {url}")
+            # Not wrapped in wait_for: the fetch may wait on the rate limiter or a Retry-After pause far longer
+            # than a request takes, and a timed-out thread would keep sending requests. The requests timeout
+            # covers a stalled server, and the batch deadline covers everything else.
+            page = await loop.run_in_executor(
+                ctx["fetch_executor"],
+                functools.partial(fetch, url, session=ctx["session"], timeout=ctx["request_timeout"]),
+            )
+        # Parsing and writing run on their own worker so downloads keep flowing
+        ok = await loop.run_in_executor(ctx["process_executor"], process_page, name, page)
+        error = None if ok else "decklist not found"
+    except Exception as e:
+        from edhrec import is_retryable
+        ok, error, retryable = False, str(e) or type(e).__name__, is_retryable(e)
+        status = getattr(getattr(e, "response", None), "status_code", None)
+
+    result = ScrapeResult(name, ok, time.perf_counter() - start, error, status, retryable)
+    ctx["progress"].report(result)
+    return result
+
+
+async def _scrape_all(jobs, fetch, process_page, concurrency, max_per_host, request_timeout, deadline,
+                      session_factory):
+    fetch_executor = ThreadPoolExecutor(max_workers=concurrency)
+    process_executor = ThreadPoolExecutor(max_workers=1)
+    session = session_factory(pool_maxsize=concurrency)
+    ctx = {
+        "session": session,
+        "fetch_executor": fetch_executor,
+        "process_executor": process_executor,
+        "host_limits": {},
+        "max_per_host": min(max_per_host, concurrency),
+        "request_timeout": request_timeout,
+        "progress": _Progress(len(jobs)),
+    }
+    pending = ()
+    try:
+        tasks = {
+            asyncio.ensure_future(_scrape_one(name, url, fetch, process_page, ctx)): name
+            for name, url in jobs
+        }
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+
+        results = [task.result() for task in done]
+        if pending:
+            logging.error(f"Deadline of {deadline}s reached with {len(pending)} commanders still pending.")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task in pending:
+                if not task.cancelled() and task.exception() is None:
+                    results.append(task.result())  # Finished while being cancelled
+                    continue
+                result = ScrapeResult(tasks[task], False, deadline, "deadline exceeded")
+                ctx["progress"].report(result)
+                results.append(result)
+        return results
+    finally:
+        # Don't wait on downloads that were abandoned at the deadline
+        fetch_executor.shutdown(wait=not pending, cancel_futures=True)
+        process_executor.shutdown(wait=True)
+        session.close()
+
+
+def scrape_concurrently(jobs, fetch, process_page, concurrency=DEFAULT_CONCURRENCY, max_per_host=MAX_PER_HOST,
+                        request_timeout=None, deadline=DEFAULT_DEADLINE, session_factory=None):
+    """Fetch many pages in parallel and process each one as soon as it arrives.
+
+    `jobs` is a list of (name, url) pairs. `fetch(url, session=, timeout=)`
+    runs on a thread pool and its result is passed to `process_page(name, result)`,
+    which must return True when the page yielded a decklist. Returns one
+    ScrapeResult per job, in completion order. `session_factory(pool_maxsize=)`
+    creates the shared session (edhrec.create_session by default), and
+    `request_timeout` is the requests timeout for connecting and for each
+    read (edhrec.REQUEST_TIMEOUT by default).
+    """
+    import edhrec  # The HTTP stack is only loaded once a scrape starts
+
+    request_timeout = request_timeout or edhrec.REQUEST_TIMEOUT
+    session_factory = session_factory or edhrec.create_session
+    return asyncio.run(_scrape_all(jobs, fetch, process_page, concurrency, max_per_host, request_timeout, deadline,
+                                   session_factory))
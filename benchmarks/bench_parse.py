@@ -0,0 +1,122 @@
+"""Compare the decklist extraction paths on saved EDHREC pages.
+
+Reports the best parse time and the peak memory allocated per page.
+
+Usage:
+    python benchmarks/bench_parse.py [PAGE_OR_FOLDER ...]
+
+Pages can be plain .html files or compressed bodies from the response
+cache (*.body.z). With no arguments the response cache folder is used.
+Cached bodies of streamed downloads that stopped early are skipped, since
+they only hold the start of the page.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from edhrec import parse_code_decklist, parse_embedded_decklist, parse_targeted_decklist  # noqa: E402
+from http_cache import DEFAULT_CACHE_FOLDER  # noqa: E402
+
+PARSERS = [
+    ("embedded json", parse_embedded_decklist),
+    ("targeted", parse_targeted_decklist),
+    ("code selector", parse_code_decklist),
+]
+
+
+def is_partial_body(body_path):
+    """Return True if a cached body's metadata marks it as cut off by a streamed download."""
+    try:
+        with open(body_path[:-len(".body.z")] + ".json", "r", encoding="utf-8") as file:
+            return json.load(file).get("partial", False)
+    except (OSError, ValueError):
+        return False
+
+
+def load_pages(paths):
+    """Return (name, bytes) for every saved page under the given files or folders."""
+    pages = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, f) for f in os.listdir(path))
+        else:
+            files = [path]
+        for file_path in files:
+            if file_path.endswith(".body.z"):
+                if is_partial_body(file_path):
+                    print(f"Skipping {os.path.basename(file_path)}: truncated by a streamed download")
+                    continue
+                with open(file_path, "rb") as file:
+                    pages.append((os.path.basename(file_path), zlib.decompress(file.read())))
+            elif file_path.endswith((".html", ".htm")):
+                with open(file_path, "rb") as file:
+                    pages.append((os.path.basename(file_path), file.read()))
+    return pages
+
+
+def time_parser(parser, page, repeat):
+    """Return the best time per call in milliseconds, and the parser's result."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = parser(page)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def peak_memory(parser, page):
+    """Return the peak memory in KiB allocated while parsing a page once."""
+    tracemalloc.start()
+    try:
+        parser(page)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark EDHREC decklist extraction.")
+    parser.add_argument("paths", nargs="*", default=[DEFAULT_CACHE_FOLDER], help="Saved pages or folders of pages.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per page; the best time is kept.")
+    args = parser.parse_args()
+
+    pages = load_pages(args.paths)
+    if not pages:
+        print("No saved pages found.")
+        return
+
+    totals = {name: 0.0 for name, _ in PARSERS}
+    peaks = {name: 0.0 for name, _ in PARSERS}
+    print(f"{'page':<32} {'KiB':>7} " + " ".join(f"{name:>24}" for name, _ in PARSERS) + "  cards")
+    print(f"{'':<32} {'':>7} " + " ".join(f"{'ms / peak KiB':>24}" for _ in PARSERS))
+    for page_name, page in pages:
+        columns = []
+        cards = []
+        for name, parse in PARSERS:
+            elapsed, rows = time_parser(parse, page, args.repeat)
+            peak = peak_memory(parse, page)
+            totals[name] += elapsed
+            peaks[name] = max(peaks[name], peak)
+            columns.append(f"{elapsed:>12.2f} / {peak:>9.0f}")
+            cards.append("-" if rows is None else str(len(rows)))
+        print(f"{page_name[:32]:<32} {len(page) / 1024:>7.1f} " + " ".join(f"{c:>24}" for c in columns)
+              + "  " + "/".join(cards))
+
+    baseline = totals["code selector"]
+    print()
+    for name, _ in PARSERS:
+        speedup = baseline / totals[name] if totals[name] else float("inf")
+        print(f"{name:<15} total {totals[name]:9.2f} ms  ({speedup:.1f}x vs code selector)  "
+              f"max peak {peaks[name]:9.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Measure how long DeckMaster takes to start for commands that don't scrape.
+
+Every measurement runs in a fresh interpreter, the way the CLI is started:
+a bare interpreter, `import combo`, `import edhrec` (the HTTP and HTML stack
+that is only loaded once a scrape runs) and a whole `--custom` run against a
+copy of the collection in a temporary folder. The imports that cost the most
+are listed from `python -X importtime`. With --save the results are appended
+to a CSV history, so start-up time can be tracked from commit to commit.
+
+Usage:
+    python benchmarks/bench_startup.py [--decklist FILE] [--repeat 10] [--save]
+"""
+import argparse
+import csv
+import datetime
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_HISTORY_FILE = os.path.join(ROOT, "benchmarks", "startup_history.csv")
+HISTORY_FIELDS = ("date", "commit", "python", "interpreter_ms", "import_combo_ms", "import_edhrec_ms", "custom_run_ms")
+# Modules that should only be imported once a scrape (or the service) needs them
+HEAVY_MODULES = ("requests", "bs4", "lxml", "urllib3", "asyncio", "ssl", "http.server")
+
+
+def run_python(arguments, cwd):
+    """Run the current interpreter with `arguments` and return the wall time in milliseconds."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *arguments], cwd=cwd, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+
+def best_time(arguments, cwd, repeat):
+    """Return the best of `repeat` runs in milliseconds, or None if the command fails."""
+    try:
+        return min(run_python(arguments, cwd) for _ in range(repeat))
+    except subprocess.CalledProcessError:
+        return None
+
+
+def import_profile(module):
+    """Return (cumulative µs, self µs, indented name) for every import made by `import module`."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():  # Skips the header line
+            imports.append((int(cumulative_us), int(self_us), name.rstrip()[1:]))  # Indented two spaces per level
+    return imports
+
+
+def measure_custom_run(decklist, repeat):
+    """Return the best time of a --custom run in a temporary folder holding a copy of the collection."""
+    with tempfile.TemporaryDirectory() as folder:
+        collection = os.path.join(ROOT, "collection.csv")
+        if os.path.exists(collection):
+            shutil.copy(collection, folder)
+        arguments = [os.path.join(ROOT, "combo.py"), "--custom", os.path.abspath(decklist), "--no-service"]
+        run_python(arguments, folder)  # Builds the collection index once, like any earlier run would have
+        return best_time(arguments, folder, repeat)
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def save_results(path, results):
+    """Append one row of results to the history CSV and return the previous row, if any."""
+    previous = None
+    if os.path.exists(path):
+        with open(path, newline="", encoding="utf-8") as file:
+            for previous in csv.DictReader(file):
+                pass
+    new_file = not os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=HISTORY_FIELDS)
+        if new_file:
+            writer.writeheader()
+        writer.writerow(results)
+    return previous
+
+
+def format_ms(value):
+    return "n/a" if value is None or value == "" else f"{float(value):8.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DeckMaster start-up time.")
+    parser.add_argument("--decklist", help="Custom decklist for the --custom run (default: the first one in "
+                                           "costume DeckLists).")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per measurement; the best time is kept.")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list.")
+    parser.add_argument("--save", action="store_true", help="Append the results to the history file.")
+    parser.add_argument("--history", default=DEFAULT_HISTORY_FILE, help="CSV file the results are saved to.")
+    args = parser.parse_args()
+
+    decklist = args.decklist
+    if decklist is None:
+        custom_folder = os.path.join(ROOT, "costume DeckLists")
+        names = sorted(name for name in os.listdir(custom_folder) if name.endswith(".txt"))
+        decklist = os.path.join(custom_folder, names[0]) if names else None
+
+    results = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": current_commit(),
+        "python": platform.python_version(),
+        "interpreter_ms": best_time(["-c", "pass"], ROOT, args.repeat),
+        "import_combo_ms": best_time(["-c", "import combo"], ROOT, args.repeat),
+        "import_edhrec_ms": best_time(["-c", "import edhrec"], ROOT, args.repeat),
+        "custom_run_ms": measure_custom_run(decklist, args.repeat) if decklist else None,
+    }
+
+    print(f"interpreter start            {format_ms(results['interpreter_ms'])}")
+    print(f"import combo                 {format_ms(results['import_combo_ms'])}")
+    print(f"import edhrec (on demand)    {format_ms(results['import_edhrec_ms'])}")
+    print(f"--custom run                 {format_ms(results['custom_run_ms'])}")
+
+    imports = import_profile("combo")
+    loaded = {name.strip() for _, _, name in imports}
+    heavy = [module for module in HEAVY_MODULES if module in loaded]
+    print(f"\nHeavy modules loaded by `import combo`: {', '.join(heavy) or 'none'}")
+    print("Slowest imports under combo (cumulative / self):")
+    direct = [entry for entry in imports if entry[2].startswith("  ") and not entry[2].startswith("    ")]
+    for cumulative_us, self_us, name in sorted(direct, reverse=True)[:args.top]:
+        print(f"  {name.strip():<28} {cumulative_us / 1000:8.1f} ms {self_us / 1000:8.1f} ms")
+
+    if args.save:
+        row = {key: "" if value is None else round(value, 1) if isinstance(value, float) else value
+               for key, value in results.items()}
+        previous = save_results(args.history, row)
+        print(f"\nSaved to {args.history}")
+        if previous:
+            print(f"Previous run ({previous['commit'] or previous['date']}): "
+                  f"import combo {format_ms(previous['import_combo_ms']).strip()}, "
+                  f"--custom run {format_ms(previous['custom_run_ms']).strip()}")
+
+
+if __name__ == "__main__":
+    main()
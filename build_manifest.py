@@ -0,0 +1,80 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+MANIFEST_FILE = ".manifest.json"
+MANIFEST_VERSION = 1
+
+
+def inputs_digest(*inputs):
+    """Return a SHA-256 digest of JSON-serialisable inputs, independent of dict ordering."""
+    data = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def write_if_changed(path, data):
+    """Write bytes to `path` unless the file already holds exactly them; return True if written.
+
+    Leaving identical files alone keeps their mtimes stable for sync tools.
+    """
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, "rb") as file:
+                if file.read() == data:
+                    return False
+    except OSError:
+        pass
+    # Unique per process and thread: --all-custom workers and service requests can write the same folder at once
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+def _output_stats(folder, outputs):
+    stats = {}
+    for name in outputs:
+        stat = os.stat(os.path.join(folder, name))
+        stats[name] = [stat.st_size, stat.st_mtime_ns]
+    return stats
+
+
+def load_manifest(folder):
+    """Return the build manifest saved in a commander folder, or an empty one."""
+    try:
+        with open(os.path.join(folder, MANIFEST_FILE), "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return manifest if manifest.get("version") == MANIFEST_VERSION else {}
+
+
+def is_up_to_date(folder, manifest, digest):
+    """Return True if the folder's outputs were built from `digest` and haven't been touched since."""
+    if manifest.get("inputs") != digest:
+        return False
+    try:
+        return _output_stats(folder, manifest.get("outputs", {})) == manifest["outputs"]
+    except OSError:
+        return False  # An output was deleted
+
+
+def save_manifest(folder, digest, outputs, summary=None):
+    """Record the inputs digest and the current state of the outputs of a commander folder."""
+    manifest = {"version": MANIFEST_VERSION, "inputs": digest, "outputs": _output_stats(folder, outputs),
+                "summary": summary}
+    try:
+        write_if_changed(os.path.join(folder, MANIFEST_FILE),
+                         json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+    except OSError as e:
+        logging.warning(f"Could not save build manifest in {folder}: {e}")
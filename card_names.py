@@ -0,0 +1,41 @@
+import re
+import unicodedata
+
+FACE_SEPARATOR = re.compile(r"\s*/{1,2}\s*")
+WHITESPACE = re.compile(r"\s+")
+
+# Typographic characters that show up in exports and hand-written lists
+PUNCTUATION = str.maketrans({
+    "‘": "'", "’": "'", "ʼ": "'", "´": "'", "`": "'",
+    "“": '"', "”": '"',
+    "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-",
+    " ": " ",
+})
+
+
+def normalize_card_name(name):
+    """Return the canonical lookup key for a card name.
+
+    Accents are folded ("Lim-Dûl" -> "lim-dul"), curly quotes and dashes are
+    replaced by ASCII ones, whitespace is collapsed, and the result is
+    lowercased. Split and double-faced names are written "a // b".
+    """
+    name = unicodedata.normalize("NFKD", name.translate(PUNCTUATION))
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    name = WHITESPACE.sub(" ", name).strip().lower()
+    if "/" in name:
+        name = " // ".join(face for face in FACE_SEPARATOR.split(name) if face)
+    return name
+
+
+def card_name_keys(name):
+    """Return every key a card can be looked up by: its full name first, then each face.
+
+    "Aetherblade Agent // Gitaxian Mindstinger" is found by the full name and
+    by either face, since decklists usually give only the front face.
+    """
+    key = normalize_card_name(name)
+    keys = [key]
+    if " // " in key:
+        keys.extend(face for face in key.split(" // ") if face not in keys)
+    return keys
@@ -0,0 +1,350 @@
+import bisect
+import gzip
+import hashlib
+import heapq
+import json
+import logging
+import mmap
+import os
+import struct
+
+from card_names import card_name_keys, normalize_card_name
+
+DEFAULT_CARD_STORE = os.path.join(".cache", "cards.db")
+STORE_MAGIC = b"DMCS"
+STORE_VERSION = 3
+JSON_CHUNK_SIZE = 1 << 20  # Characters read from the bulk file at a time
+SORT_RUN_SIZE = 1 << 16  # Key entries sorted at a time while ingesting, before they are packed
+
+# Header: magic, version, then (offset, count) for each of the three key tables and the name summaries
+HEADER = struct.Struct("<4sI8Q")
+# Key table entry: 64-bit key hash, record offset
+KEY_ENTRY = struct.Struct("<QQ")
+# Name summary entry: 64-bit name key hash, oracle ID (blank if unknown), cheapest USD price in cents
+NAME_SUMMARY = struct.Struct("<Q36sI")
+NO_PRICE = 0xFFFFFFFF
+
+SCRYFALL_ID, ORACLE_ID, NAME = range(3)
+
+# Card fields kept from the bulk data; everything else is dropped
+PRICE_FIELDS = ("usd", "usd_foil", "eur", "eur_foil")
+
+
+def key_hash(value):
+    """Return the 64-bit hash a key is stored under."""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def iter_json_array(file, chunk_size=JSON_CHUNK_SIZE):
+    """Yield the elements of a top-level JSON array read incrementally from a text file.
+
+    Only the element being decoded (plus one chunk) is held in memory, so
+    bulk files of hundreds of MB stream in constant space.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position = "", 0
+    started = eof = False
+    while True:
+        # Skip whitespace and separators, reading more when the buffer runs out
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and not started:
+                if buffer[position] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) or eof:
+                break
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+
+        if position >= len(buffer) or buffer[position] == "]":
+            return
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = file.read(chunk_size)  # The element continues past the buffer
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield element
+        position = end
+
+
+def compact_card(card):
+    """Keep only the fields DeckMaster uses from a Scryfall card object."""
+    faces = card.get("card_faces") or [{}]
+    prices = card.get("prices") or {}
+    # Localised and Universes Beyond printings can carry a different printed name
+    aliases = [alias for alias in (card.get("printed_name"), card.get("flavor_name"),
+                                   faces[0].get("printed_name"), faces[0].get("flavor_name"))
+               if alias and alias != card.get("name")]
+    return {
+        "id": card.get("id"),
+        "oracle_id": card.get("oracle_id") or faces[0].get("oracle_id"),
+        "name": card.get("name"),
+        "set": card.get("set"),
+        "collector_number": card.get("collector_number"),
+        "rarity": card.get("rarity"),
+        "type_line": card.get("type_line") or faces[0].get("type_line"),
+        "cmc": card.get("cmc"),
+        "color_identity": "".join(card.get("color_identity") or ()),
+        "prices": {field: prices[field] for field in PRICE_FIELDS if prices.get(field)},
+        "aliases": list(dict.fromkeys(aliases)),
+    }
+
+
+def record_name_keys(record):
+    """Return every name key a stored card is found by: oracle name, faces and printed aliases."""
+    keys = card_name_keys(record["name"] or "")
+    for alias in record.get("aliases", ()):
+        keys.extend(key for key in card_name_keys(alias) if key not in keys)
+    return keys
+
+
+def open_bulk_file(path):
+    """Open a Scryfall bulk JSON file as text, gzip-compressed or not."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+class _KeyTableBuilder:
+    """Collects one key table while ingesting, as sorted runs of packed 16-byte entries.
+
+    Only the current run is held as Python tuples; finished runs are packed
+    bytes and are merged into one sorted table when the store is written.
+    """
+
+    def __init__(self, run_size=SORT_RUN_SIZE):
+        self.run_size = run_size
+        self.count = 0
+        self._pending = []
+        self._runs = []
+
+    def add(self, key, offset):
+        """Add an entry for `key` and return the key's hash."""
+        hashed = key_hash(key)
+        self._pending.append((hashed, offset))
+        self.count += 1
+        if len(self._pending) >= self.run_size:
+            self._pack_run()
+        return hashed
+
+    def _pack_run(self):
+        if self._pending:
+            self._pending.sort()
+            self._runs.append(b"".join(KEY_ENTRY.pack(*entry) for entry in self._pending))
+            self._pending = []
+
+    def write(self, file):
+        """Write every entry to `file` in sorted order."""
+        self._pack_run()
+        entries = heapq.merge(*(KEY_ENTRY.iter_unpack(run) for run in self._runs))
+        batch = []
+        for entry in entries:
+            batch.append(KEY_ENTRY.pack(*entry))
+            if len(batch) >= self.run_size:
+                file.write(b"".join(batch))
+                batch = []
+        file.write(b"".join(batch))
+        self._runs = []
+
+
+def price_cents(record, currency="usd"):
+    """Return a record's price in cents, or None if it has no price in that currency."""
+    try:
+        return round(float(record["prices"][currency]) * 100)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def ingest_scryfall_bulk(bulk_path, store_path=DEFAULT_CARD_STORE):
+    """Stream a Scryfall bulk-data file into a card store and return the number of cards written.
+
+    Records are written as compact JSON lines while reading; only the three
+    key tables are kept in memory, packed at 16 bytes per key in sorted runs
+    that are merged when the tables are appended. A summary per card name
+    (oracle ID and cheapest USD price) is added too, so comparisons don't
+    have to decode every printing of a card. The store replaces
+    `store_path` atomically.
+    """
+    tables = (_KeyTableBuilder(), _KeyTableBuilder(), _KeyTableBuilder())
+    summaries = {}  # name key hash -> [oracle ID, cheapest USD price in cents]
+    os.makedirs(os.path.dirname(store_path) or ".", exist_ok=True)
+    tmp_path = f"{store_path}.tmp"
+    count = 0
+    with open_bulk_file(bulk_path) as bulk_file, open(tmp_path, "wb") as store:
+        store.write(b"\0" * HEADER.size)
+        for card in iter_json_array(bulk_file):
+            if card.get("object") != "card" or not card.get("id"):
+                continue
+            record = compact_card(card)
+            offset = store.tell()
+            store.write(json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n")
+            tables[SCRYFALL_ID].add(record["id"], offset)
+            if record["oracle_id"]:
+                tables[ORACLE_ID].add(record["oracle_id"], offset)
+            cents = price_cents(record)
+            for name_key in record_name_keys(record):
+                summary = summaries.setdefault(tables[NAME].add(name_key, offset), [None, None])
+                if summary[0] is None:
+                    summary[0] = record["oracle_id"]
+                if cents is not None and (summary[1] is None or cents < summary[1]):
+                    summary[1] = cents
+            count += 1
+            if count % 50000 == 0:
+                logging.info(f"Ingested {count} cards...")
+
+        header = [STORE_MAGIC, STORE_VERSION]
+        for table in tables:
+            header.extend((store.tell(), table.count))
+            table.write(store)
+        header.extend((store.tell(), len(summaries)))
+        store.write(b"".join(NAME_SUMMARY.pack(hashed, (oracle_id or "").encode("ascii"),
+                                               NO_PRICE if cents is None else cents)
+                             for hashed, (oracle_id, cents) in sorted(summaries.items())))
+        store.seek(0)
+        store.write(HEADER.pack(*header))
+    os.replace(tmp_path, store_path)
+    logging.info(f"Card store written to {store_path} ({count} cards)")
+    return count
+
+
+class CardStore:
+    """Read-only, memory-mapped view of a card store written by ingest_scryfall_bulk.
+
+    Each lookup binary-searches a sorted key table inside the mapping and
+    decodes only the matching records, so opening the store costs nothing
+    and memory use stays with the OS page cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, *tables = HEADER.unpack_from(self._mm, 0)
+        if magic != STORE_MAGIC or version != STORE_VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a card store of version {STORE_VERSION}; ingest the bulk file again")
+        self._tables = [(tables[i], tables[i + 1]) for i in range(0, 6, 2)]
+        self._summaries = (tables[6], tables[7])
+
+    @classmethod
+    def open(cls, path=DEFAULT_CARD_STORE):
+        """Return the card store at `path`, or None if there isn't a usable one."""
+        try:
+            return cls(path)
+        except (OSError, ValueError) as e:
+            if os.path.exists(path):
+                logging.warning(f"Could not open card store: {e}")
+            return None
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._tables[SCRYFALL_ID][1]
+
+    def _hash_at(self, table, index):
+        offset, _ = self._tables[table]
+        return KEY_ENTRY.unpack_from(self._mm, offset + index * KEY_ENTRY.size)[0]
+
+    def _records(self, table, value):
+        offset, count = self._tables[table]
+        target = key_hash(value)
+        keys = _KeyView(self, table, count)
+        index = bisect.bisect_left(keys, target)
+        while index < count:
+            entry_hash, record_offset = KEY_ENTRY.unpack_from(self._mm, offset + index * KEY_ENTRY.size)
+            if entry_hash != target:
+                break
+            end = self._mm.find(b"\n", record_offset)
+            yield json.loads(self._mm[record_offset:end])
+            index += 1
+
+    def by_scryfall_id(self, scryfall_id):
+        """Return the printing with this Scryfall ID, or None."""
+        scryfall_id = scryfall_id.strip().lower()
+        for record in self._records(SCRYFALL_ID, scryfall_id):
+            if record["id"] == scryfall_id:
+                return record
+        return None
+
+    def by_oracle_id(self, oracle_id):
+        """Return every printing of the card with this oracle ID."""
+        oracle_id = oracle_id.strip().lower()
+        return [record for record in self._records(ORACLE_ID, oracle_id) if record["oracle_id"] == oracle_id]
+
+    def by_name(self, card_name):
+        """Return every printing whose full name, face or printed name matches `card_name`."""
+        key = normalize_card_name(card_name)
+        return [record for record in self._records(NAME, key) if key in record_name_keys(record)]
+
+    def name_summary(self, card_name):
+        """Return (oracle ID, cheapest USD price) for a card name, either None when unknown.
+
+        Read from the precomputed name summaries, without decoding any printing.
+        """
+        offset, count = self._summaries
+        target = key_hash(normalize_card_name(card_name))
+        index = bisect.bisect_left(_SummaryView(self, offset, count), target)
+        if index == count:
+            return None, None
+        hashed, oracle_id, cents = NAME_SUMMARY.unpack_from(self._mm, offset + index * NAME_SUMMARY.size)
+        if hashed != target:
+            return None, None
+        return oracle_id.rstrip(b"\0").decode("ascii") or None, None if cents == NO_PRICE else cents / 100
+
+    def oracle_id(self, card_name):
+        """Return the oracle ID of the card a (possibly localised or alternate) name refers to, or None."""
+        return self.name_summary(card_name)[0]
+
+    def price(self, card_name, currency="usd"):
+        """Return the cheapest known price of any printing of a card, or None."""
+        if currency == "usd":
+            return self.name_summary(card_name)[1]
+        prices = [float(record["prices"][currency]) for record in self.by_name(card_name)
+                  if currency in record["prices"]]
+        return min(prices) if prices else None
+
+
+class _KeyView:
+    """Sequence view of a key table's hashes, so bisect can search the mapping directly."""
+
+    def __init__(self, store, table, count):
+        self.store = store
+        self.table = table
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return self.store._hash_at(self.table, index)
+
+
+class _SummaryView:
+    """Sequence view of the name summaries' hashes, for bisect."""
+
+    def __init__(self, store, offset, count):
+        self.store = store
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return NAME_SUMMARY.unpack_from(self.store._mm, self.offset + index * NAME_SUMMARY.size)[0]
@@ -0,0 +1,94 @@
+import logging
+import os
+import re
+
+DEFAULT_VOCABULARY_FILE = os.path.join(".cache", "vocabulary.txt")
+HEADER_PREFIX = "# deckmaster card vocabulary "
+
+NONZERO_BYTE = re.compile(rb"[^\x00]")
+BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+class CardVocabulary:
+    """Shared table interning each normalised card key as a dense uint32 ID.
+
+    The table is persisted as an append-only UTF-8 file with one key per line,
+    so a card's ID is its line number and stays stable across runs. The
+    header carries a random token; structures that store IDs record it and
+    are rebuilt if the vocabulary file is ever replaced.
+    """
+
+    def __init__(self, path=DEFAULT_VOCABULARY_FILE, token=None, keys=None):
+        self.path = path
+        self.token = token or os.urandom(8).hex()
+        self.keys = keys or []  # card ID -> normalised key
+        self.ids = {key: card_id for card_id, key in enumerate(self.keys)}
+        self._saved = len(self.keys) if keys else 0
+
+    @classmethod
+    def load(cls, path=DEFAULT_VOCABULARY_FILE):
+        """Read the vocabulary at `path`, or start an empty one if there is none."""
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                header = file.readline()
+                if not header.startswith(HEADER_PREFIX):
+                    raise ValueError("missing header")
+                keys = file.read().split("\n")
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            if os.path.exists(path):
+                logging.warning(f"Ignoring unreadable card vocabulary {path}: {e}")
+            return cls(path)
+        if keys and keys[-1] == "":
+            keys.pop()
+        return cls(path, header[len(HEADER_PREFIX):].strip(), keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.ids
+
+    def get(self, key):
+        """Return the ID of a normalised key, or None if it was never interned."""
+        return self.ids.get(key)
+
+    def intern(self, key):
+        """Return the ID of a normalised key, adding it to the table if it is new."""
+        card_id = self.ids.get(key)
+        if card_id is None:
+            card_id = self.ids[key] = len(self.keys)
+            self.keys.append(key)
+        return card_id
+
+    def save(self):
+        """Append the keys interned since the last save to the table file."""
+        if self._saved == len(self.keys) and os.path.exists(self.path):
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if self._saved == 0 or not os.path.exists(self.path):
+            with open(self.path, "w", encoding="utf-8", newline="\n") as file:
+                file.write(f"{HEADER_PREFIX}{self.token}\n")
+            self._saved = 0
+        with open(self.path, "a", encoding="utf-8", newline="\n") as file:
+            file.writelines(f"{key}\n" for key in self.keys[self._saved:])
+        self._saved = len(self.keys)
+
+
+def bitset(card_ids):
+    """Return a bitset (a Python int) with the bit of every card ID set."""
+    card_ids = list(card_ids)
+    if not card_ids:
+        return 0
+    bits = bytearray(max(card_ids) // 8 + 1)
+    for card_id in card_ids:
+        bits[card_id >> 3] |= 1 << (card_id & 7)
+    return int.from_bytes(bits, "little")
+
+
+def iter_bits(bits):
+    """Yield the card IDs set in a bitset, lowest first."""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for match in NONZERO_BYTE.finditer(data):  # Skips the empty stretches in C
+        offset = match.start() * 8
+        for bit in BYTE_BITS[data[match.start()]]:
+            yield offset + bit
@@ -0,0 +1,209 @@
+import csv
+import hashlib
+import logging
+import os
+import pickle
+
+from card_names import card_name_keys, normalize_card_name
+from fuzzy_index import TrigramIndex
+
+# Bump whenever the layout of the saved index changes so old files are rebuilt
+INDEX_VERSION = 5
+INDEX_SUFFIX = ".idx"
+
+NAME_COLUMN = 0
+QUANTITY_COLUMN = 6
+SCRYFALL_ID_COLUMN = 8
+
+
+def file_fingerprint(path):
+    """Return the (mtime, size) pair used as the cheap change check for a file."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_hash(path):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_fingerprint(card_store):
+    """Return the (mtime, size) of a card store's file, or None without a store."""
+    if card_store is None:
+        return None
+    try:
+        return file_fingerprint(card_store.path)
+    except OSError:
+        return None
+
+
+def parse_quantity(value, default=1):
+    """Parse a Quantity cell, falling back to `default` for blank or malformed values."""
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        return default
+    return quantity if quantity > 0 else default
+
+
+class CollectionIndex:
+    """Compiled view of the ManaBox collection export, saved next to the CSV.
+
+    Each card is one entry holding the total number of copies owned across
+    all of its printings. Normalised name keys (see card_names) are computed
+    once at build time and map to entries; both faces of a double-faced or
+    split card map to the same entry as its full name. The index is keyed on
+    the export's mtime, size and content hash, and on the card store it was
+    resolved against. It is only rebuilt from the CSV
+    when the export actually changes; otherwise it is loaded from its binary file.
+    """
+
+    def __init__(self, keys, quantities, names, fuzzy, oracles, mtime_ns, size, sha256, store_fingerprint=None):
+        self.keys = keys  # normalised name or face -> entry number
+        self.quantities = quantities  # entry number -> total quantity
+        self.names = names  # entry number -> card name (oracle name when known)
+        self.fuzzy = fuzzy  # TrigramIndex over the keys
+        self.oracles = oracles  # oracle ID -> entry number
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.sha256 = sha256
+        self.store_fingerprint = store_fingerprint  # (mtime, size) of the card store used, or None
+
+    def __contains__(self, card_name):
+        return normalize_card_name(card_name) in self.keys
+
+    def __len__(self):
+        return len(self.quantities)
+
+    def count_oracle(self, oracle_id):
+        """Return the owned quantity of every printing of the card with this oracle ID."""
+        entry = self.oracles.get(oracle_id)
+        return 0 if entry is None else self.quantities[entry]
+
+    def count(self, key):
+        """Return the owned quantity for an already normalised name key."""
+        entry = self.keys.get(key)
+        return 0 if entry is None else self.quantities[entry]
+
+    def quantity(self, card_name):
+        """Return how many copies of a card are owned, over all printings."""
+        return self.count(normalize_card_name(card_name))
+
+    def suggest(self, key):
+        """Return the exported names of owned cards close to an unmatched name key, best first."""
+        return [self.names[entry] for entry, _ in self.fuzzy.search(key)]
+
+    def diff(self, other):
+        """Return (name keys, oracle IDs) whose owned quantity differs between this index and `other`."""
+        if self.sha256 == other.sha256 and self.store_fingerprint == other.store_fingerprint:
+            return set(), set()
+        keys = {key for key in self.keys.keys() | other.keys.keys() if self.count(key) != other.count(key)}
+        oracles = {oracle_id for oracle_id in self.oracles.keys() | other.oracles.keys()
+                   if self.count_oracle(oracle_id) != other.count_oracle(oracle_id)}
+        return keys, oracles
+
+    def is_current(self, csv_path, card_store=None):
+        """Return True if the CSV and card store still have the mtime and size this index was built from."""
+        return (file_fingerprint(csv_path) == (self.mtime_ns, self.size)
+                and store_fingerprint(card_store) == self.store_fingerprint)
+
+    @classmethod
+    def build(cls, csv_path, card_store=None):
+        """Parse the collection CSV in one pass and return a fresh index."""
+        mtime_ns, size = file_fingerprint(csv_path)
+        keys, quantities, names, oracles = {}, [], [], {}
+        with open(csv_path, mode="r", newline="", encoding="utf-8") as collection_file:
+            collection_reader = csv.reader(collection_file)
+            next(collection_reader, None)  # Skip header
+            for row in collection_reader:
+                if len(row) >= 7:  # Ensure row has enough columns
+                    name = row[NAME_COLUMN].strip()
+                    oracle_id = None
+                    if card_store is not None and len(row) > SCRYFALL_ID_COLUMN and row[SCRYFALL_ID_COLUMN]:
+                        printing = card_store.by_scryfall_id(row[SCRYFALL_ID_COLUMN])
+                        if printing is not None and printing["oracle_id"]:
+                            oracle_id, name = printing["oracle_id"], printing["name"]
+
+                    # Oracle name first, so every printing is found under the card's real name
+                    card_keys = card_name_keys(name)
+                    card_keys.extend(key for key in card_name_keys(row[NAME_COLUMN]) if key not in card_keys)
+                    entry = oracles.get(oracle_id)
+                    if entry is None:
+                        entry = keys.get(card_keys[0])
+                    if entry is None:
+                        # A front face exported on its own is the same card as the full name
+                        entry = keys.get(card_keys[1]) if len(card_keys) > 1 else None
+                    if entry is None:
+                        entry = len(quantities)
+                        quantities.append(0)
+                        names.append(name)
+                    if oracle_id is not None:
+                        oracles.setdefault(oracle_id, entry)
+                    for key in card_keys:
+                        keys.setdefault(key, entry)
+                    quantities[entry] += parse_quantity(row[QUANTITY_COLUMN])
+        return cls(keys, quantities, names, TrigramIndex.build(keys), oracles, mtime_ns, size, file_hash(csv_path),
+                   store_fingerprint(card_store))
+
+    def save(self, index_path):
+        """Write the index to disk atomically."""
+        payload = {
+            "version": INDEX_VERSION,
+            "mtime_ns": self.mtime_ns,
+            "size": self.size,
+            "sha256": self.sha256,
+            "keys": self.keys,
+            "quantities": self.quantities,
+            "names": self.names,
+            "fuzzy": self.fuzzy,
+            "oracles": self.oracles,
+            "store_fingerprint": self.store_fingerprint,
+        }
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(payload, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def load(cls, index_path):
+        """Read a saved index, or return None if it is missing or outdated."""
+        try:
+            with open(index_path, "rb") as file:
+                payload = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError):
+            return None
+        if not isinstance(payload, dict) or payload.get("version") != INDEX_VERSION:
+            return None
+        return cls(payload["keys"], payload["quantities"], payload["names"], payload["fuzzy"],
+                   payload["oracles"], payload["mtime_ns"], payload["size"], payload["sha256"],
+                   payload["store_fingerprint"])
+
+    @classmethod
+    def open(cls, csv_path, index_path=None, card_store=None):
+        """Return the index for a collection CSV, rebuilding it only if the CSV or card store changed."""
+        index_path = index_path or csv_path + INDEX_SUFFIX
+        mtime_ns, size = file_fingerprint(csv_path)
+
+        index = cls.load(index_path)
+        if index is not None and index.store_fingerprint != store_fingerprint(card_store):
+            index = None  # Printings must be resolved against the current card store
+        if index is not None and (index.mtime_ns, index.size) == (mtime_ns, size):
+            return index
+
+        # mtime/size differ: only rebuild if the contents really changed
+        if index is not None and index.size == size and index.sha256 == file_hash(csv_path):
+            index.mtime_ns = mtime_ns
+            index.save(index_path)
+            return index
+
+        logging.info(f"Building collection index from {csv_path}")
+        index = cls.build(csv_path, card_store)
+        try:
+            index.save(index_path)
+        except OSError as e:
+            logging.warning(f"Could not save collection index: {e}")
+        return index
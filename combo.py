@@ -1,10 +1,28 @@
-import requests
-from bs4 import BeautifulSoup
 import csv
 import os
-import urllib.parse
 import logging
 import argparse
+import time
+import functools
+import concurrent.futures
+import threading
+import io
+
+from allocation import allocate_copies, deck_priorities
+from build_manifest import inputs_digest, is_up_to_date, load_manifest, save_manifest, write_if_changed
+from card_store import CardStore, ingest_scryfall_bulk
+from card_vocabulary import CardVocabulary
+from collection_index import INDEX_VERSION, CollectionIndex
+from commander_directory import CommanderDirectory
+from deck_library import (build_card_index, decklist_paths, is_decklist_path, load_decklists, merge_deck_rows,
+                          read_custom_decklist, read_deck)
+from deck_ranking import DEFAULT_TOP_K, DeckCorpus, collection_vector
+from edhrec_urls import EDHREC_BASE_URL, average_deck_url, commander_slug
+from flat_index import FlatCollectionIndex
+from fuzzy_index import MAX_CANDIDATES, TrigramIndex
+from http_cache import DEFAULT_TTL, ResponseCache
+from rate_limit import DEFAULT_DEADLINE, DEFAULT_RATE, MAX_REQUEUES, TokenBucket, backoff_delay
+from service_client import DEFAULT_SERVICE_PORT, call_service, find_service
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,185 +31,757 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 CUSTOM_DECKLISTS_FOLDER = "costume DeckLists"
 COMMANDERS_FOLDER = "commanders"
 COLLECTION_FILE = "collection.csv"
+HTTP_CACHE_FOLDER = os.path.join(".cache", "http")
+COMMANDER_DIRECTORY_FILE = os.path.join(".cache", "commanders.json")
+CARD_STORE_FILE = os.path.join(".cache", "cards.db")
+VOCABULARY_FILE = os.path.join(".cache", "vocabulary.txt")
+FLAT_INDEX_FILE = os.path.join(".cache", "collection.flat")
+DECK_SUMMARY_FILE = "deck_summary.csv"
+MISSING_CARDS_FILE = "missing_cards.csv"
+ALLOCATION_FILE = "allocation.csv"
+CUSTOM_SUMMARY_FILE = "custom_summary.csv"
+REPORT_FILES = ("owned_cards.csv", "partially_owned_cards.csv", "not_owned_cards.csv")
 
 def create_folder_if_not_exists(folder_path):
     """Create a folder if it doesn't already exist."""
     if not os.path.exists(folder_path):
-        os.makedirs(folder_path)
+        os.makedirs(folder_path, exist_ok=True)  # Another worker may create it at the same time
         logging.info(f"Created folder: {folder_path}")
 
-def process_custom_decklist(decklist_path):
-    """Process a custom decklist and compare it with the collection."""
+_collection_index = None
+_commander_directory = None
+_card_store = None
+
+def load_commander_directory():
+    """Return the commander directory (known slugs and negative cache), loaded once per process."""
+    global _commander_directory
+    if _commander_directory is None:
+        _commander_directory = CommanderDirectory.load(COMMANDER_DIRECTORY_FILE, COMMANDERS_FOLDER)
+    return _commander_directory
+
+
+def load_collection_index():
+    """Return the compiled collection index, or None if there is no collection file.
+
+    The index is cached for the lifetime of the process and refreshed from disk
+    only when the collection export or the offline card store changes.
+    """
+    global _collection_index
+    if not os.path.isfile(COLLECTION_FILE):
+        return None
+    card_store = load_card_store()
+    if _collection_index is None or not _collection_index.is_current(COLLECTION_FILE, card_store):
+        _collection_index = CollectionIndex.open(COLLECTION_FILE, card_store=card_store)
+    return _collection_index
+
+def load_card_store():
+    """Return the offline card store built by --ingest-scryfall, or None if it hasn't been built."""
+    global _card_store
+    if _card_store is None:
+        _card_store = CardStore.open(CARD_STORE_FILE)
+    return _card_store
+
+
+def ingest_card_data(bulk_path):
+    """Build the offline card store from a downloaded Scryfall bulk-data file."""
+    global _card_store
+    logging.info(f"Ingesting Scryfall bulk data from {bulk_path}")
+    try:
+        ingest_scryfall_bulk(bulk_path, CARD_STORE_FILE)
+    except (OSError, ValueError) as e:
+        logging.error(f"Could not ingest Scryfall bulk data: {e}")
+        return
+    if _card_store is not None:
+        _card_store.close()
+        _card_store = None
+
+def write_cards_csv(path, rows, header=("Quantity", "Name")):
+    """Write a Quantity/Name CSV file, leaving it untouched if its contents wouldn't change."""
+    buffer = io.StringIO(newline="")
+    writer = csv.writer(buffer)
+    writer.writerow(header)  # Write header
+    writer.writerows(rows)
+    return write_if_changed(path, buffer.getvalue().encode("utf-8"))
+
+def resolve_card(collection, card_store, key, name, quantity):
+    """Return (owned copies, price per copy, suggestions) for a deck card needing `quantity` copies.
+
+    Price and suggestions are only looked up when copies are missing.
+    """
+    have = collection.count(key)
+    oracle_id = price = None
+    if have < quantity and card_store:
+        oracle_id, price = card_store.name_summary(name)
+    if not have and oracle_id:
+        # Alternate or localised name: compare by oracle identity instead
+        have = collection.count_oracle(oracle_id)
+    if have >= quantity:
+        return have, None, ""
+    suggestions = "" if have else " | ".join(collection.suggest(key))
+    return have, price, suggestions
+
+def write_comparison(commander_folder, needed, resolved):
+    """Write the owned, partially owned and not owned reports for one deck.
+
+    `needed` is the deck's merged cards and `resolved` maps each key to
+    resolve_card's result. Returns (owned, partially owned, not owned,
+    missing copies, missing cost).
+    """
+    owned_cards = []
+    partially_owned_cards = []
+    not_owned_cards = []
+    missing_copies = 0
+    missing_cost = 0.0
+
+    for key, (quantity, name) in needed.items():
+        have, price, suggestions = resolved[key]
+        if have >= quantity:
+            owned_cards.append([quantity, name])
+            continue
+        missing_copies += quantity - have
+        if price is not None:
+            missing_cost += price * (quantity - have)
+        if have:
+            partially_owned_cards.append([quantity, name, have, quantity - have, price])
+        else:
+            not_owned_cards.append([quantity, name, suggestions, price])
+
+    owned_file, partially_owned_file, not_owned_file = REPORT_FILES
+    write_cards_csv(os.path.join(commander_folder, owned_file), owned_cards)
+    write_cards_csv(os.path.join(commander_folder, partially_owned_file), partially_owned_cards,
+                    header=("Quantity", "Name", "Owned", "Missing", "Price (USD)"))
+    write_cards_csv(os.path.join(commander_folder, not_owned_file), not_owned_cards,
+                    header=("Quantity", "Name", "Suggestion", "Price (USD)"))
+    return len(owned_cards), len(partially_owned_cards), len(not_owned_cards), missing_copies, missing_cost
+
+def compare_with_collection(rows, commander_folder):
+    """Split decklist rows into owned, partially owned and not owned cards and write the CSV files.
+
+    A card is owned when the collection has at least as many copies (over all
+    printings) as the deck's Quantity, and partially owned when it has some
+    but not enough; that report lists how many copies are owned and missing.
+    Cards with no exact match get the closest owned names as suggestions in
+    a separate column; they are never counted as owned. When the offline card
+    store exists, the reports for missing cards also list the cheapest USD
+    price per copy.
+
+    Returns write_comparison's counts, or None if there is no collection.
+    """
+    collection = load_collection_index()
+    if collection is None:
+        logging.warning("Collection file not found.")
+        return None
+
+    logging.info("Collection file found. Comparing...")
+
+    card_store = load_card_store()
+    needed = merge_deck_rows(rows)
+    resolved = {key: resolve_card(collection, card_store, key, name, quantity)
+                for key, (quantity, name) in needed.items()}
+    counts = write_comparison(commander_folder, needed, resolved)
+    missing_cost = counts[4]
+
+    logging.info("Comparison completed.")
+    if card_store:
+        logging.info(f"Estimated cost of missing cards: ${missing_cost:.2f}")
+    logging.info(f"Owned cards saved to {os.path.join(commander_folder, 'owned_cards.csv')}")
+    logging.info(f"Partially owned cards saved to {os.path.join(commander_folder, 'partially_owned_cards.csv')}")
+    logging.info(f"Not owned cards saved to {os.path.join(commander_folder, 'not_owned_cards.csv')}")
+    return counts
+
+def needed_copies(users, allocate=False):
+    """Return how many copies of a card the decks using it need: the most any deck needs, or the sum."""
+    # Shared copies can run out even when each deck alone would be covered
+    return sum(quantity for _, quantity in users) if allocate else max(quantity for _, quantity in users)
+
+def resolve_shared_cards(decks, card_index, keys, collection, card_store, allocate=False):
+    """Resolve each card in `keys` once for all the decks using it; returns {key: resolve_card result}."""
+    resolved = {}
+    for key in keys:
+        users = card_index[key]
+        name = decks[users[0][0]].cards[key][1]
+        resolved[key] = resolve_card(collection, card_store, key, name, needed_copies(users, allocate))
+    return resolved
+
+def update_deck_reports(deck, resolved, collection, card_store, deck_allocation=None):
+    """Write one deck's reports unless its build manifest shows they are current.
+
+    Returns (summary row, True if the reports were recomputed).
+    """
+    create_folder_if_not_exists(deck.folder)
+    digest = inputs_digest(deck.cards, deck_allocation, INDEX_VERSION, collection.sha256,
+                           collection.store_fingerprint)
+    manifest = load_manifest(deck.folder)
+    if manifest.get("summary") and is_up_to_date(deck.folder, manifest, digest):
+        return manifest["summary"], False
+
+    if deck_allocation is not None:
+        resolved = {key: (deck_allocation[key],) + resolved[key][1:] for key in deck.cards}
+    owned, partially_owned, not_owned, missing_copies, missing_cost = write_comparison(deck.folder, deck.cards,
+                                                                                       resolved)
+    total = len(deck.cards)
+    summary = [deck.name, total, owned, partially_owned, not_owned, missing_copies,
+               f"{owned / total:.0%}" if total else "", f"{missing_cost:.2f}" if card_store else ""]
+    save_manifest(deck.folder, digest, REPORT_FILES, summary)
+    return summary, True
+
+def write_deck_overview(decks, card_index, resolved, summary, allocate=False):
+    """Write the summary of all decks and the list of cards missing from any of them.
+
+    Returns (summary path, missing cards path).
+    """
+    shopping_list = []
+    for key, users in card_index.items():
+        have, price, _ = resolved[key]
+        needed = needed_copies(users, allocate)
+        if have < needed:
+            shopping_list.append([decks[users[0][0]].cards[key][1], len(users), needed, have, price])
+
+    summary_path = os.path.join(COMMANDERS_FOLDER, DECK_SUMMARY_FILE)
+    missing_path = os.path.join(COMMANDERS_FOLDER, MISSING_CARDS_FILE)
+    write_cards_csv(summary_path, summary, header=("Deck", "Cards", "Owned", "Partially Owned", "Not Owned",
+                                                   "Missing Copies", "Completion", "Missing Cost (USD)"))
+    shopping_list.sort(key=lambda row: row[1], reverse=True)  # Cards wanted by the most decks first
+    write_cards_csv(missing_path, shopping_list,
+                    header=("Name", "Decks", "Total Needed" if allocate else "Most Needed", "Owned", "Price (USD)"))
+    return summary_path, missing_path
+
+def compare_all_decks(allocate=False):
+    """Compare every stored decklist with the collection in a single pass.
+
+    All decks under commanders/ and the custom decklist folder are loaded and
+    indexed by card, so each distinct card is resolved against the collection
+    once however many decks use it. Every deck gets its usual reports, plus
+    a summary of all decks and a list of the cards missing from any of them.
+
+    With `allocate`, decks no longer each assume the whole collection: every
+    owned copy is assigned to one deck (see allocation.allocate_copies) and
+    the reports count only the copies assigned to that deck.
+
+    Each deck folder keeps a build manifest of its inputs (the deck, the
+    collection index and card store it was compared against, and its
+    allocation). Decks whose manifest still matches are skipped, and reports
+    whose contents didn't change are not rewritten.
+    """
+    collection = load_collection_index()
+    if collection is None:
+        logging.warning("Collection file not found.")
+        return
+
+    decks = load_decklists(COMMANDERS_FOLDER, CUSTOM_DECKLISTS_FOLDER)
+    if not decks:
+        logging.warning("No stored decklists found.")
+        return
+    card_index = build_card_index(decks)
+    logging.info(f"Comparing {len(decks)} decks ({len(card_index)} distinct cards) with the collection...")
+
+    # One pass over the distinct cards of all decks
+    card_store = load_card_store()
+    resolved = resolve_shared_cards(decks, card_index, card_index, collection, card_store, allocate)
+
+    allocation = None
+    if allocate:
+        owned_copies = {key: card[0] for key, card in resolved.items()}
+        allocation = allocate_copies(card_index, owned_copies, deck_priorities(decks, owned_copies))
+        write_cards_csv(os.path.join(COMMANDERS_FOLDER, ALLOCATION_FILE),
+                        ([decks[number].name, decks[number].cards[key][1], decks[number].cards[key][0], copies]
+                         for key, allocated in allocation.items() for number, copies in allocated.items() if copies),
+                        header=("Deck", "Name", "Quantity", "Allocated"))
+
+    summary = []
+    unchanged = 0
+    for number, deck in enumerate(decks):
+        deck_allocation = {key: allocation[key][number] for key in deck.cards} if allocation is not None else None
+        row, recomputed = update_deck_reports(deck, resolved, collection, card_store, deck_allocation)
+        summary.append(row)
+        unchanged += not recomputed
+    logging.info(f"{len(decks) - unchanged} decks recomputed, {unchanged} unchanged since the last run.")
+
+    summary_path, missing_path = write_deck_overview(decks, card_index, resolved, summary, allocate)
+    logging.info(f"Compared {len(decks)} decks. Summary saved to {summary_path}, missing cards to {missing_path}")
+    if allocate:
+        logging.info(f"Owned copies allocated across decks; see {os.path.join(COMMANDERS_FOLDER, ALLOCATION_FILE)}")
+
+def watch_decks(poll=False):
+    """Keep every deck's reports current while the collection and decklists change.
+
+    The collection export, the custom decklist folder and the saved decks
+    under commanders/ are watched (inotify where available, otherwise
+    polling). Bursts of saves are debounced into one update. Only the
+    decklist files that changed are re-read, and a deck is recomputed only
+    if its own cards changed or the collection changed for one of them. A
+    new export is diffed against the previous index by card key, so
+    re-exporting an unchanged collection recomputes nothing. Reports of
+    decks that were not affected are left as they are.
+    """
+    from file_watcher import OVERFLOW, create_watcher, debounced_changes  # ctypes is only needed here
+
+    collection = load_collection_index()
+    if collection is None:
+        logging.warning("Collection file not found.")
+        return
+    card_store = load_card_store()
+
+    # decklist path -> Deck (None if unreadable), in load_decklists order so custom files still take precedence
+    parsed = {}
+    decks_by_name, summary, resolved = {}, {}, {}
+    relevant = functools.partial(is_decklist_path, commanders_folder=COMMANDERS_FOLDER,
+                                 custom_folder=CUSTOM_DECKLISTS_FOLDER)
+    watcher = create_watcher(lambda path: os.path.normpath(path) == COLLECTION_FILE or relevant(path), poll)
+    watcher.watch(os.path.dirname(COLLECTION_FILE) or ".")
+    watcher.watch(CUSTOM_DECKLISTS_FOLDER)
+    watcher.watch(COMMANDERS_FOLDER, recursive=True)
+
+    bursts = debounced_changes(watcher)
+    changes, missed = set(), True  # Start with a full pass
+    while True:
+        start = time.perf_counter()
+        new_collection = load_collection_index()
+        if new_collection is None:
+            logging.warning("Collection file not found; waiting for it to come back.")
+            missed = True
+        else:
+            rescan = missed or OVERFLOW in changes
+            missed = False
+
+            # Re-read only the decklists that changed, appeared or disappeared
+            new_parsed = {}
+            for path in decklist_paths(COMMANDERS_FOLDER, CUSTOM_DECKLISTS_FOLDER):
+                if path in parsed and not rescan and path not in changes:
+                    new_parsed[path] = parsed[path]
+                    continue
+                try:
+                    new_parsed[path] = read_deck(path, COMMANDERS_FOLDER)
+                except (OSError, IndexError, UnicodeDecodeError) as e:
+                    logging.warning(f"Skipping decklist {path}: {e}")
+                    new_parsed[path] = None
+            parsed = new_parsed
+            new_decks_by_name = {deck.name: deck for deck in parsed.values() if deck is not None}
+            changed_decks = {name for name, deck in new_decks_by_name.items()
+                             if name not in decks_by_name or decks_by_name[name].cards != deck.cards}
+            for name in decks_by_name.keys() - new_decks_by_name.keys():
+                summary.pop(name, None)
+            decks_by_name = new_decks_by_name
+            decks = list(decks_by_name.values())
+            card_index = build_card_index(decks)
+
+            # Cards to resolve again: those of changed decks, and those whose owned copies changed
+            stale_keys = {key for name in changed_decks for key in decks_by_name[name].cards}
+            stale_keys.update(card_index.keys() - resolved.keys())
+            if new_collection is not collection:
+                changed_keys, changed_oracles = collection.diff(new_collection)
+                stale_keys.update(changed_keys & card_index.keys())
+                if changed_oracles and card_store:
+                    # Cards matched by oracle identity rather than by name
+                    stale_keys.update(key for key, users in card_index.items()
+                                      if not new_collection.count(key)
+                                      and card_store.oracle_id(decks[users[0][0]].cards[key][1]) in changed_oracles)
+                appeared = {key for key in changed_keys if (key in collection.keys) != (key in new_collection.keys)}
+                if appeared:
+                    # Names added to or removed from the collection can change the suggestions for unowned cards
+                    unowned = [key for key in card_index if key not in stale_keys and not resolved[key][0]]
+                    nearby = TrigramIndex.build({key: number for number, key in enumerate(unowned)})
+                    stale_keys.update(unowned[entry] for key in appeared
+                                      for entry, _ in nearby.search(key, limit=MAX_CANDIDATES))
+                if changed_keys or changed_oracles:
+                    logging.info(f"Collection changed: {len(changed_keys)} card names differ, "
+                                 f"{len(changed_keys & card_index.keys())} of them used by decks.")
+                else:
+                    logging.info("Collection saved, but no owned quantities changed.")
+                collection = new_collection
+
+            stale_keys &= card_index.keys()
+            if rescan or stale_keys or changed_decks:
+                resolved = {key: card for key, card in resolved.items() if key in card_index}
+                affected = set(changed_decks)
+                for key, card in resolve_shared_cards(decks, card_index, stale_keys, collection, card_store).items():
+                    if resolved.get(key) != card:  # Other decks using the card are only affected if its result changed
+                        resolved[key] = card
+                        affected.update(decks[number].name for number, _ in card_index[key])
+                recomputed = 0
+                for deck in decks:
+                    if rescan or deck.name in affected:
+                        summary[deck.name], updated = update_deck_reports(deck, resolved, collection, card_store)
+                        recomputed += updated
+                write_deck_overview(decks, card_index, resolved, [summary[deck.name] for deck in decks])
+                logging.info(f"{recomputed} of {len(decks)} decks recomputed in {time.perf_counter() - start:.2f}s.")
+
+        logging.info("Watching for changes (Ctrl+C to stop)...")
+        try:
+            changes = next(bursts)
+        except KeyboardInterrupt:
+            watcher.close()
+            return
+
+def rank_cached_decks(k=DEFAULT_TOP_K, by="missing"):
+    """Log the k cached EDHREC average decks that need the fewest (or cheapest) additions."""
+    collection = load_collection_index()
+    if collection is None:
+        logging.warning("Collection file not found.")
+        return
+    card_store = load_card_store()
+    if by == "cost" and card_store is None:
+        logging.warning("No card store for prices; run --ingest-scryfall first. Ranking by missing cards instead.")
+        by = "missing"
+
+    vocabulary = CardVocabulary.load(VOCABULARY_FILE)
+    corpus = DeckCorpus.open(ResponseCache(HTTP_CACHE_FOLDER), COMMANDERS_FOLDER, vocabulary, card_store)
+    if not len(corpus):
+        logging.warning("No cached EDHREC decks found.")
+        return
+    ranking = corpus.rank(collection_vector(vocabulary, collection), k=k, by=by)
+    logging.info(f"Top {len(ranking)} of {len(corpus)} cached decks by {'missing cost' if by == 'cost' else 'missing cards'}:")
+    for position, (slug, cards, coverage, missing, missing_cost) in enumerate(ranking, start=1):
+        cost = f", ${missing_cost:.2f} to complete" if card_store else ""
+        logging.info(f"{position:>3}. {slug}: {coverage:.0%} of {cards} cards owned, {missing} missing{cost}")
+
+def is_in_custom_folder(decklist_path):
+    """Return True if a path resolves to a file inside the custom decklist folder."""
+    folder = os.path.realpath(CUSTOM_DECKLISTS_FOLDER)
     try:
-        with open(decklist_path, "r", encoding="utf-8") as file:
-            lines = file.readlines()
+        return os.path.commonpath([folder, os.path.realpath(decklist_path)]) == folder
+    except ValueError:  # Another drive on Windows
+        return False
+
+def process_custom_decklist(decklist_path):
+    """Process a custom decklist and compare it with the collection.
 
-        # Extract the commander name from the first line
-        commander_name = lines[0].split(" ", 1)[1].strip()
-        formatted_name = commander_name.replace(",", "").replace("'", "").replace(" ", "-").lower()
+    Returns (deck folder name, comparison counts or None), or None on error.
+    """
+    try:
+        commander_name, rows = read_custom_decklist(decklist_path)
+        formatted_name = commander_slug(commander_name)
 
         # Create a folder for the custom decklist with (Custom) suffix
         commander_folder = os.path.join(COMMANDERS_FOLDER, f"{formatted_name} (Custom)")
         create_folder_if_not_exists(commander_folder)
 
-        # Prepare data for CSV
-        rows = [line.strip().split(" ", 1) for line in lines if line.strip()]
-
         # Save the decklist to a CSV file
         csv_path = os.path.join(commander_folder, f"{formatted_name}.csv")
-        with open(csv_path, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-            writer.writerow(["Quantity", "Name"])  # Write header
-            writer.writerows(rows)
+        write_cards_csv(csv_path, rows)
 
         logging.info(f"Decklist saved to {csv_path}")
 
         # Compare with collection file (if it exists)
-        if os.path.isfile(COLLECTION_FILE):
-            logging.info("Collection file found. Comparing...")
-
-            collection_cards = set()
-            with open(COLLECTION_FILE, mode="r", newline="", encoding="utf-8") as collection_file:
-                collection_reader = csv.reader(collection_file)
-                next(collection_reader)  # Skip header
-                for row in collection_reader:
-                    if len(row) >= 7:  # Ensure row has enough columns
-                        collection_cards.add(row[0].strip().lower())
-
-            # Compare the decklist with the collection
-            owned_cards = []
-            not_owned_cards = []
-
-            for row in rows:
-                quantity, name = row
-                card_name = name.strip().lower()
-                if card_name in collection_cards:
-                    owned_cards.append([quantity, name])
-                else:
-                    not_owned_cards.append([quantity, name])
-
-            # Write owned cards to a CSV file
-            with open(os.path.join(commander_folder, "owned_cards.csv"), mode="w", newline="", encoding="utf-8") as owned_file:
-                writer = csv.writer(owned_file)
-                writer.writerow(["Quantity", "Name"])
-                writer.writerows(owned_cards)
-
-            # Write not owned cards to a CSV file
-            with open(os.path.join(commander_folder, "not_owned_cards.csv"), mode="w", newline="", encoding="utf-8") as not_owned_file:
-                writer = csv.writer(not_owned_file)
-                writer.writerow(["Quantity", "Name"])
-                writer.writerows(not_owned_cards)
-
-            logging.info("Comparison completed.")
-            logging.info(f"Owned cards saved to {os.path.join(commander_folder, 'owned_cards.csv')}")
-            logging.info(f"Not owned cards saved to {os.path.join(commander_folder, 'not_owned_cards.csv')}")
-        else:
-            logging.warning("Collection file not found.")
+        return os.path.basename(commander_folder), compare_with_collection(rows, commander_folder)
 
     except Exception as e:
         logging.error(f"An error occurred while processing the custom decklist: {e}")
+        return None
 
-def scrape_and_process_commander(commander_name):
-    """Scrapes EDHREC data for a commander, creates necessary folders, and generates CSV files."""
-    # Format and encode the commander's name for the URL
-    formatted_name = commander_name.replace(",", "").replace("'", "").replace(" ", "-").lower()
-    encoded_name = urllib.parse.quote(formatted_name)
+def _init_custom_worker(flat_index_path):
+    """Pool initializer: map the parent's published collection index so workers never load their own."""
+    global _collection_index
+    if flat_index_path:
+        _collection_index = FlatCollectionIndex.attach(flat_index_path)
+
+def _process_custom_worker(decklist_path):
+    start = time.perf_counter()
+    result = process_custom_decklist(decklist_path)
+    return decklist_path, result, time.perf_counter() - start
+
+def process_all_custom_decklists(workers=None):
+    """Process every custom decklist in a process pool and write a run summary.
+
+    The collection index is loaded once here and published as a flat,
+    memory-mapped file (see flat_index) that every worker maps read-only,
+    so workers share one copy in the page cache whatever the pool size.
+    """
+    if not os.path.isdir(CUSTOM_DECKLISTS_FOLDER):
+        logging.warning(f"No '{CUSTOM_DECKLISTS_FOLDER}' folder found.")
+        return
+    decklist_paths = [os.path.join(CUSTOM_DECKLISTS_FOLDER, f) for f in sorted(os.listdir(CUSTOM_DECKLISTS_FOLDER))
+                      if f.endswith(".txt")]
+    if not decklist_paths:
+        logging.warning(f"No decklists found in '{CUSTOM_DECKLISTS_FOLDER}'.")
+        return
+
+    collection = load_collection_index()
+    flat_index_path = None
+    if collection is not None:
+        FlatCollectionIndex.publish(collection, FLAT_INDEX_FILE).close()
+        flat_index_path = FLAT_INDEX_FILE
+    priced = load_card_store() is not None
+    workers = max(1, min(workers or os.cpu_count() or 1, len(decklist_paths)))
+    logging.info(f"Processing {len(decklist_paths)} custom decklists with {workers} workers...")
+    start = time.perf_counter()
+    summary = []
+    failed = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_custom_worker,
+                                                initargs=(flat_index_path,)) as pool:
+        chunksize = max(1, len(decklist_paths) // (workers * 4))
+        for decklist_path, result, elapsed in pool.map(_process_custom_worker, decklist_paths, chunksize=chunksize):
+            decklist = os.path.basename(decklist_path)
+            if result is None:
+                failed += 1
+                summary.append([decklist, "", "", "", "", "", "", "", "", f"{elapsed:.2f}", "error"])
+                continue
+            deck_name, counts = result
+            if counts is None:
+                summary.append([decklist, deck_name, "", "", "", "", "", "", "", f"{elapsed:.2f}", "no collection"])
+                continue
+            owned, partially_owned, not_owned, missing_copies, missing_cost = counts
+            total = owned + partially_owned + not_owned
+            summary.append([decklist, deck_name, total, owned, partially_owned, not_owned, missing_copies,
+                            f"{owned / total:.0%}" if total else "", f"{missing_cost:.2f}" if priced else "",
+                            f"{elapsed:.2f}", "ok"])
+
+    summary_path = os.path.join(COMMANDERS_FOLDER, CUSTOM_SUMMARY_FILE)
+    create_folder_if_not_exists(COMMANDERS_FOLDER)
+    write_cards_csv(summary_path, summary, header=("Decklist", "Deck", "Cards", "Owned", "Partially Owned",
+                                                   "Not Owned", "Missing Copies", "Completion", "Missing Cost (USD)",
+                                                   "Seconds", "Status"))
+    logging.info(f"Processed {len(decklist_paths) - failed}/{len(decklist_paths)} custom decklists in "
+                 f"{time.perf_counter() - start:.1f}s. Summary saved to {summary_path}")
+
+# requests and the HTML parsers take most of the start-up time, so edhrec is only imported once a scrape runs
+def fetch_decklist(url, **kwargs):
+    """Download and parse an average-deck page with edhrec.fetch_decklist."""
+    from edhrec import fetch_decklist
+    return fetch_decklist(url, **kwargs)
+
+def create_session(**kwargs):
+    """Create a pooled EDHREC session with edhrec.create_session."""
+    from edhrec import create_session
+    return create_session(**kwargs)
+
+def make_fetcher(cache=None, offline=False, stream=False):
+    """Return fetch_decklist preconfigured with the response cache and download options."""
+    return functools.partial(fetch_decklist, cache=cache, offline=offline, stream=stream)
+
+def process_scraped_commander(formatted_name, rows):
+    """Save a decklist scraped from EDHREC and compare it with the collection.
+
+    Returns True if the page had a decklist.
+    """
+    if not rows:
+        logging.warning("Decklist not found on the EDHREC page.")
+        return False
 
     # Create a directory for the commander with (EDHREC) suffix
     commander_folder = os.path.join(COMMANDERS_FOLDER, f"{formatted_name} (EDHREC)")
     create_folder_if_not_exists(commander_folder)
 
-    # Create the URL
-    url = f"https://edhrec.com/average-decks/{encoded_name}"
-    logging.info(f"Fetching data from: {url}")
+    # Save the content to a CSV file
+    csv_path = os.path.join(commander_folder, f"{formatted_name}.csv")
+    write_cards_csv(csv_path, rows)
 
+    logging.info(f"Decklist saved to {csv_path}")
+
+    # Compare with collection file (if it exists)
+    compare_with_collection(rows, commander_folder)
+    return True
+
+def scrape_commander(commander_name, session=None, fetch=fetch_decklist, base_url=EDHREC_BASE_URL):
+    """Scrape and process one commander, returning a ScrapeResult.
+
+    The exact slug is requested first. If EDHREC has no average deck for it,
+    the closest known commander (a likely typo) is tried instead. Slugs that
+    recently returned 404 are skipped without a request.
+    """
+    import requests
+    from async_scraper import ScrapeResult
+    from edhrec import is_retryable
+
+    start = time.perf_counter()
+    directory = load_commander_directory()
+
+    # Resolve the commander's name to the slug used in the URL
+    slugs = [directory.resolve(commander_name)]
+    ok, error, status, retryable = False, "EDHREC recently returned 404", None, False
     try:
-        # Send a GET request to the URL
-        response = requests.get(url)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-
-        # Parse the HTML content with BeautifulSoup
-        soup = BeautifulSoup(response.content, "lxml")
-
-        # Use a CSS selector to locate the decklist
-        content = soup.select("code")
-
-        if content:
-            # Extract the text from the first matching element
-            content_text = content[0].get_text(strip=True)
-
-            # Remove double quotes and process the content
-            content_text = content_text.replace('"', '')
-            if len(content_text) > 1:
-                content_text = content_text[1:]
-
-            # Prepare data for CSV
-            rows = [line.split(" ", 1) for line in content_text.splitlines() if line.strip()]
-
-            # Save the content to a CSV file
-            csv_path = os.path.join(commander_folder, f"{formatted_name}.csv")
-            with open(csv_path, mode="w", newline="", encoding="utf-8") as file:
-                writer = csv.writer(file)
-                writer.writerow(["Quantity", "Name"])  # Write header
-                writer.writerows(rows)
-
-            logging.info(f"Decklist saved to {csv_path}")
-
-            # Compare with collection file (if it exists)
-            if os.path.isfile(COLLECTION_FILE):
-                logging.info("Collection file found. Comparing...")
-
-                collection_cards = set()
-                with open(COLLECTION_FILE, mode="r", newline="", encoding="utf-8") as collection_file:
-                    collection_reader = csv.reader(collection_file)
-                    next(collection_reader)  # Skip header
-                    for row in collection_reader:
-                        if len(row) >= 7:  # Ensure row has enough columns
-                            collection_cards.add(row[0].strip().lower())
-
-                # Compare the web CSV content with the collection
-                owned_cards = []
-                not_owned_cards = []
-
-                with open(csv_path, mode="r", newline="", encoding="utf-8") as web_file:
-                    web_reader = csv.reader(web_file)
-                    next(web_reader)  # Skip header
-                    for row in web_reader:
-                        if len(row) >= 2:
-                            quantity, name = row
-                            card_name = name.strip().lower()
-                            if card_name in collection_cards:
-                                owned_cards.append([quantity, name])
-                            else:
-                                not_owned_cards.append([quantity, name])
-
-                # Write owned cards to a CSV file
-                with open(os.path.join(commander_folder, "owned_cards.csv"), mode="w", newline="", encoding="utf-8") as owned_file:
-                    writer = csv.writer(owned_file)
-                    writer.writerow(["Quantity", "Name"])
-                    writer.writerows(owned_cards)
-
-                # Write not owned cards to a CSV file
-                with open(os.path.join(commander_folder, "not_owned_cards.csv"), mode="w", newline="", encoding="utf-8") as not_owned_file:
-                    writer = csv.writer(not_owned_file)
-                    writer.writerow(["Quantity", "Name"])
-                    writer.writerows(not_owned_cards)
-
-                logging.info("Comparison completed.")
-                logging.info(f"Owned cards saved to {os.path.join(commander_folder, 'owned_cards.csv')}")
-                logging.info(f"Not owned cards saved to {os.path.join(commander_folder, 'not_owned_cards.csv')}")
+        for formatted_name in slugs:
+            if directory.is_missing(formatted_name):
+                logging.warning(f"Skipping '{formatted_name}': EDHREC recently had no average deck for it.")
             else:
-                logging.warning("Collection file not found.")
+                if formatted_name != slugs[0]:
+                    logging.info(f"Trying the closest known commander instead: '{directory.display_name(formatted_name)}'")
+
+                # Create the URL
+                url = average_deck_url(formatted_name, base_url)
+                logging.info(f"Fetching data from: {url}")
+                try:
+                    rows = fetch(url, session=session)
+                except requests.exceptions.RequestException as e:
+                    logging.error(f"Error fetching data: {e}")
+                    error, retryable = str(e), is_retryable(e)
+                    status = getattr(e.response, "status_code", None)
+                    if status != 404:
+                        break
+                    directory.record_missing(formatted_name)
+                else:
+                    ok = process_scraped_commander(formatted_name, rows)
+                    if ok:
+                        directory.record_found(formatted_name, commander_name)
+                        error, status = None, None
+                    else:
+                        error = "decklist not found"
+                    break
+
+            # EDHREC has no page for the exact slug: try the closest known commander once
+            closest = directory.closest(formatted_name) if len(slugs) == 1 else None
+            if closest is not None:
+                slugs.append(closest)
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {e}")
+        ok, error = False, str(e)
+    finally:
+        directory.save()
+    return ScrapeResult(commander_name, ok, time.perf_counter() - start, error, status, retryable, formatted_name)
+
+def scrape_and_process_commander(commander_name, session=None, fetch=fetch_decklist, base_url=EDHREC_BASE_URL):
+    """Scrapes EDHREC data for a commander, creates necessary folders, and generates CSV files.
+
+    Pass a shared session to reuse pooled connections across commanders, and a
+    `fetch` configured with make_fetcher() to use the response cache or streaming.
+    Returns True if the decklist was fetched and processed.
+    """
+    return scrape_commander(commander_name, session=session, fetch=fetch, base_url=base_url).ok
+
+def read_batch_file(batch_path):
+    """Read commander names from a file, one per line. Blank lines and # comments are skipped."""
+    with open(batch_path, "r", encoding="utf-8") as file:
+        names = [line.strip() for line in file]
+    # Drop comments, blanks and repeated names while keeping the file's order
+    return list(dict.fromkeys(name for name in names if name and not name.startswith("#")))
+
+def scrape_batch_sequentially(commander_names, fetch, session_factory=create_session, base_url=EDHREC_BASE_URL):
+    """Scrape commanders one after another over one pooled session."""
+    results = []
+    with session_factory() as session:
+        for i, commander_name in enumerate(commander_names, start=1):
+            result = scrape_commander(commander_name, session=session, fetch=fetch, base_url=base_url)
+            results.append(result)
+            status = "done" if result.ok else "FAILED"
+            logging.info(f"[{i}/{len(commander_names)}] {commander_name}: {status} in {result.elapsed:.2f}s")
+    return results
+
+def scrape_batch_concurrently(commander_names, fetch, concurrency, deadline, session_factory=create_session,
+                              base_url=EDHREC_BASE_URL):
+    """Resolve commander slugs, then fetch every page that isn't known to 404 with the asyncio engine.
+
+    Names whose exact slug returns 404 get a second round under the closest
+    known commander, like scrape_commander.
+    """
+    from async_scraper import ScrapeResult, scrape_concurrently
+
+    start = time.perf_counter()
+    directory = load_commander_directory()
+    slugs, skipped = {}, []
+    for name in commander_names:
+        slug = directory.resolve(name)
+        if directory.is_missing(slug):
+            slug = directory.closest(slug)  # The exact slug 404ed recently, so only the fallback is left
+        if slug is None or directory.is_missing(slug):
+            logging.warning(f"Skipping '{name}': EDHREC recently had no average deck for '{directory.resolve(name)}'.")
+            skipped.append(ScrapeResult(name, False, 0.0, "EDHREC recently returned 404"))
+        else:
+            slugs[name] = slug
 
+    results = {}
+    queue = list(slugs)
+    while queue:
+        remaining = deadline - (time.perf_counter() - start)
+        if remaining <= 0:
+            break
+        jobs = [(name, average_deck_url(slugs[name], base_url)) for name in queue]
+        round_results = scrape_concurrently(
+            jobs, fetch, lambda name, rows: process_scraped_commander(slugs[name], rows),
+            concurrency=concurrency, deadline=remaining, session_factory=session_factory,
+        )
+
+        queue = []
+        for result in round_results:
+            slug = slugs[result.name]
+            results[result.name] = result._replace(slug=slug)
+            if result.ok:
+                directory.record_found(slug, result.name)
+            elif result.status == 404:
+                directory.record_missing(slug)
+                closest = directory.closest(slug) if slug == directory.resolve(result.name) else None
+                if closest is not None and not directory.is_missing(closest):
+                    logging.info(f"Trying the closest known commander for '{result.name}': '{directory.display_name(closest)}'")
+                    slugs[result.name] = closest
+                    queue.append(result.name)
+    directory.save()
+    return skipped + list(results.values())
+
+def add_known_commanders(names_path):
+    """Seed the commander directory with names from a file (one per line) for fuzzy resolution."""
+    try:
+        commander_names = read_batch_file(names_path)
+    except OSError as e:
+        logging.error(f"Could not read commander list: {e}")
+        return
+    directory = load_commander_directory()
+    for name in commander_names:
+        directory.add(name)
+    directory.save()
+    logging.info(f"Added {len(commander_names)} commanders to the directory ({len(directory)} known).")
+
+def log_batch_summary(results, total):
+    """Log how many commanders of a batch succeeded and which ones failed."""
+    if not results:
+        logging.info(f"Batch finished in {total:.2f}s without processing any commander.")
+        return
+    failed = [result.name for result in results if not result.ok]
+    logging.info(
+        f"Batch finished: {len(results) - len(failed)} succeeded, {len(failed)} failed "
+        f"in {total:.2f}s (avg {total / len(results):.2f}s per commander)"
+    )
+    if failed:
+        logging.warning(f"Failed commanders: {', '.join(failed)}")
+
+def process_batch(batch_path, fetch=fetch_decklist, concurrency=1, deadline=DEFAULT_DEADLINE,
+                  session_factory=create_session, base_url=EDHREC_BASE_URL):
+    """Scrape and process every commander listed in a batch file.
+
+    With a concurrency of 1 commanders are fetched one after another over one
+    pooled session; higher values use the asyncio engine to fetch pages in parallel.
+    Commanders that fail with a retryable error (throttling, 5xx, network)
+    are requeued up to MAX_REQUEUES times.
+    """
+    try:
+        commander_names = read_batch_file(batch_path)
+    except OSError as e:
+        logging.error(f"Could not read batch file: {e}")
+        return
+
+    if not commander_names:
+        logging.warning(f"No commanders found in '{batch_path}'.")
+        return
+
+    from async_scraper import ScrapeResult
+
+    logging.info(f"Processing {len(commander_names)} commanders from {batch_path}")
+    batch_start = time.perf_counter()
+
+    # Commanders that failed with a retryable error are requeued with jittered exponential backoff
+    final_results = {}
+    queue = commander_names
+    for attempt in range(MAX_REQUEUES + 1):
+        if attempt:
+            delay = backoff_delay(attempt)
+            logging.info(f"Requeueing {len(queue)} commanders (retry {attempt}/{MAX_REQUEUES}) in {delay:.1f}s")
+            time.sleep(delay)
+
+        if concurrency > 1:
+            remaining = deadline - (time.perf_counter() - batch_start)
+            if remaining <= 0:
+                logging.error("Batch deadline reached; not fetching the remaining commanders.")
+                final_results.update((name, ScrapeResult(name, False, 0.0, "deadline exceeded"))
+                                     for name in queue if name not in final_results)
+                break
+            results = scrape_batch_concurrently(queue, fetch, concurrency, remaining, session_factory, base_url)
         else:
-            logging.warning("Decklist not found using the CSS selector.")
-            os.rmdir(commander_folder)  # Delete empty folder if no content
+            results = scrape_batch_sequentially(queue, fetch, session_factory, base_url)
 
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching data: {e}")
-        os.rmdir(commander_folder)  # Delete empty folder on error
-    except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
+        final_results.update((result.name, result) for result in results)
+        queue = [result.name for result in results if not result.ok and result.retryable]
+        if not queue:
+            break
+
+    log_batch_summary(list(final_results.values()), time.perf_counter() - batch_start)
 
 def display_custom_decklists():
     """Display all custom decklists in the folder and allow the user to select one."""
@@ -219,7 +809,7 @@ def display_custom_decklists():
         logging.error("Invalid input. Please enter a number.")
         return None
 
-def main_menu():
+def main_menu(fetch=fetch_decklist, session_factory=create_session, base_url=EDHREC_BASE_URL):
     """Display the main menu and handle user input."""
     while True:
         print("\nWelcome to the Decklist Processor!")
@@ -233,7 +823,8 @@ def main_menu():
             if not commander_name:
                 logging.error("Commander's name cannot be empty.")
                 continue
-            scrape_and_process_commander(commander_name)
+            with session_factory() as session:
+                scrape_and_process_commander(commander_name, session=session, fetch=fetch, base_url=base_url)
         elif choice == "2":
             decklist_path = display_custom_decklists()
             if decklist_path:
@@ -245,25 +836,180 @@ def main_menu():
             logging.error("Invalid option selected.")
 
 
+def serve(port=DEFAULT_SERVICE_PORT, fetch=fetch_decklist, session_factory=create_session, base_url=EDHREC_BASE_URL):
+    """Run the DeckMaster service: warm caches behind a local JSON API (see service.py).
+
+    Concurrent requests for the same commander or decklist are merged into
+    one fetch and comparison.
+    """
+    from service import SingleFlight, create_service
+
+    # Warm everything the operations need before accepting requests
+    collection = load_collection_index()
+    load_card_store()
+    load_commander_directory()
+    logging.info(f"Collection index loaded ({len(collection) if collection is not None else 0} cards).")
+
+    flights = SingleFlight()
+    sessions = threading.local()  # One pooled session per handler thread
+
+    def session():
+        if getattr(sessions, "session", None) is None:
+            sessions.session = session_factory()
+        return sessions.session
+
+    def commander_operation(payload):
+        commander_name = payload["name"].strip()
+        if not commander_name:
+            raise ValueError("commander name is empty")
+        slug = load_commander_directory().resolve(commander_name)
+        result = flights.do(("commander", slug),
+                            lambda: scrape_commander(commander_name, session=session(), fetch=fetch, base_url=base_url))
+        return dict(result._asdict(), folder=os.path.join(COMMANDERS_FOLDER, f"{result.slug} (EDHREC)"))
+
+    def custom_operation(payload):
+        decklist_path = os.path.abspath(payload["path"])
+        if not is_in_custom_folder(decklist_path):
+            raise ValueError(f"only decklists in '{CUSTOM_DECKLISTS_FOLDER}' can be processed by the service")
+        result = flights.do(("custom", decklist_path), lambda: process_custom_decklist(decklist_path))
+        if result is None:
+            return {"path": decklist_path, "ok": False, "error": "could not process the decklist"}
+        deck_name, counts = result
+        response = {"path": decklist_path, "ok": True, "folder": os.path.join(COMMANDERS_FOLDER, deck_name)}
+        if counts is not None:
+            response.update(zip(("owned", "partially_owned", "not_owned", "missing_copies", "missing_cost"), counts))
+        return response
+
+    server = create_service({"commander": commander_operation, "custom": custom_operation}, port)
+    logging.info(f"DeckMaster service listening on http://127.0.0.1:{port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def forward_to_service(args):
+    """Send a --commander or --custom run to a running DeckMaster service.
+
+    Returns True if the service handled it, False to run locally instead.
+    """
+    if args.custom and not is_in_custom_folder(args.custom):
+        return False  # The service only reads decklists from the custom decklist folder
+    if find_service(args.service_port) is None:
+        return False
+    if args.commander:
+        operation, payload = "commander", {"name": args.commander}
+    else:
+        operation, payload = "custom", {"path": os.path.abspath(args.custom)}
+    try:
+        result = call_service(operation, payload, args.service_port)
+    except (OSError, RuntimeError) as e:
+        logging.warning(f"DeckMaster service failed ({e}); running locally instead.")
+        return False
+    if result.get("ok"):
+        logging.info(f"Processed by the DeckMaster service; reports saved in {result.get('folder')}")
+    else:
+        logging.error(f"DeckMaster service could not process the request: {result.get('error')}")
+    return True
+
 
 def main():
     """Handle command-line arguments and run the appropriate function."""
     parser = argparse.ArgumentParser(description="DeckMaster: A tool to compare Magic: The Gathering decklists.")
     parser.add_argument("--commander", help="Scrape a decklist from EDHREC for the given commander.")
     parser.add_argument("--custom", help="Use a custom decklist from the specified file.")
+    parser.add_argument("--all-custom", action="store_true",
+                        help="Process every decklist in the custom decklist folder in parallel.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes for --all-custom (default: one per CPU core).")
+    parser.add_argument("--all-decks", action="store_true",
+                        help="Compare every stored decklist (commanders/ and custom decklists) with the collection at once.")
+    parser.add_argument("--allocate", action="store_true",
+                        help="With --all-decks, share the collection between decks: each owned copy counts for one deck only.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep every deck's reports up to date as collection.csv and the decklists change.")
+    parser.add_argument("--poll", action="store_true",
+                        help="With --watch, poll for changes instead of using inotify.")
+    parser.add_argument("--rank", type=int, nargs="?", const=DEFAULT_TOP_K, metavar="K",
+                        help=f"List the K cached EDHREC decks closest to complete with your collection (default: {DEFAULT_TOP_K}).")
+    parser.add_argument("--rank-by", choices=("missing", "cost"), default="missing",
+                        help="Rank by number of missing cards or by their estimated cost (needs --ingest-scryfall).")
+    parser.add_argument("--batch", metavar="FILE", help="Scrape every commander listed in FILE (one per line).")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Number of pages to fetch in parallel in batch mode (default: 1).")
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE,
+                        help="Overall time limit in seconds for a concurrent batch run.")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL,
+                        help="Seconds a cached EDHREC page is used before it is revalidated (default: 12 hours).")
+    parser.add_argument("--offline", action="store_true", help="Only use cached EDHREC pages; never touch the network.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream EDHREC pages and stop downloading once the decklist has been received.")
+    parser.add_argument("--add-commanders", metavar="FILE",
+                        help="Add the commander names in FILE to the local directory used to resolve typos.")
+    parser.add_argument("--ingest-scryfall", metavar="FILE",
+                        help="Build the offline card store from a downloaded Scryfall bulk-data JSON file (.json or .json.gz).")
+    parser.add_argument("--base-url", default=EDHREC_BASE_URL,
+                        help="Fetch pages from this server instead of EDHREC, e.g. a local fixture_server.py.")
+    parser.add_argument("--record", metavar="FOLDER", help="Save every fetched page as a fixture in FOLDER.")
+    parser.add_argument("--replay", metavar="FOLDER",
+                        help="Answer every request from the fixtures in FOLDER instead of the network.")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help=f"Maximum requests per second to EDHREC (default: {DEFAULT_RATE:g}; 0 disables the limit).")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run the DeckMaster service, keeping caches warm behind a local JSON API.")
+    parser.add_argument("--service-port", type=int, default=DEFAULT_SERVICE_PORT,
+                        help=f"Port of the DeckMaster service (default: {DEFAULT_SERVICE_PORT}).")
+    parser.add_argument("--no-service", action="store_true",
+                        help="Run --commander and --custom locally even if a DeckMaster service is running.")
     args = parser.parse_args()
 
-    if args.commander:
+    # Single runs go to a running service unless they ask for their own fetch options
+    local_options = (args.offline or args.stream or args.record or args.replay or args.base_url != EDHREC_BASE_URL
+                     or args.cache_ttl != DEFAULT_TTL)
+    if (args.commander or args.custom) and not (args.no_service or args.serve or local_options):
+        if forward_to_service(args):
+            return
+
+    if args.replay or args.base_url != EDHREC_BASE_URL:
+        # Pages (and 404s) from recordings or a stand-in server say nothing about EDHREC itself
+        load_commander_directory().track = False
+
+    # One limiter shared by every session, so all fetch paths draw from the same budget
+    limiter = TokenBucket(args.rate) if args.rate > 0 and not args.replay else None
+    session_factory = functools.partial(create_session, record_to=args.record, replay_from=args.replay, limiter=limiter)
+    fetch = make_fetcher(ResponseCache(HTTP_CACHE_FOLDER, ttl=args.cache_ttl), offline=args.offline, stream=args.stream)
+
+    if args.serve:
+        serve(args.service_port, fetch=fetch, session_factory=session_factory, base_url=args.base_url)
+    elif args.add_commanders:
+        add_known_commanders(args.add_commanders)
+    elif args.ingest_scryfall:
+        ingest_card_data(args.ingest_scryfall)
+    elif args.batch:
+        # Scrape many commanders, sequentially or concurrently
+        process_batch(args.batch, fetch=fetch, concurrency=args.concurrency, deadline=args.deadline,
+                      session_factory=session_factory, base_url=args.base_url)
+    elif args.commander:
         # Scrape from EDHREC
         logging.info(f"Fetching decklist for commander: {args.commander}")
-        scrape_and_process_commander(args.commander)
+        with session_factory() as session:
+            scrape_and_process_commander(args.commander, session=session, fetch=fetch, base_url=args.base_url)
     elif args.custom:
         # Use a custom decklist
         logging.info(f"Using custom decklist from: {args.custom}")
         process_custom_decklist(args.custom)
+    elif args.rank is not None:
+        rank_cached_decks(args.rank, args.rank_by)
+    elif args.all_custom:
+        process_all_custom_decklists(args.workers)
+    elif args.all_decks:
+        compare_all_decks(allocate=args.allocate)
+    elif args.watch:
+        watch_decks(poll=args.poll)
     else:
         # No arguments provided, show the interactive menu
-        main_menu()
+        main_menu(fetch=fetch, session_factory=session_factory, base_url=args.base_url)
 
 if __name__ == "__main__":
     main()  # Replace the call to main_menu() with main()
@@ -0,0 +1,136 @@
+import difflib
+import json
+import logging
+import os
+import threading
+import time
+
+from edhrec_urls import commander_slug
+
+DEFAULT_DIRECTORY_FILE = os.path.join(".cache", "commanders.json")
+NEGATIVE_TTL = 7 * 24 * 60 * 60  # Seconds a slug that returned 404 is skipped
+FUZZY_CUTOFF = 0.85  # Minimum similarity for a fuzzy slug match
+
+
+class CommanderDirectory:
+    """Local index of known EDHREC commander slugs plus a negative cache of slugs that 404.
+
+    User input is requested under its exact slug first. When EDHREC has no
+    page for it, the closest known slug (a likely typo) is tried instead.
+    Slugs that recently returned 404 are skipped until their negative-cache
+    entry expires.
+    """
+
+    def __init__(self, path=DEFAULT_DIRECTORY_FILE, negative_ttl=NEGATIVE_TTL):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self.known = {}  # slug -> display name
+        self.missing = {}  # slug -> time the 404 was seen
+        # Off when pages come from recordings or a stand-in server: what they serve or 404 says nothing about EDHREC
+        self.track = True
+        self._dirty = False
+        # The service scrapes from several threads: every read and change of known/missing holds this
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, path=DEFAULT_DIRECTORY_FILE, commanders_folder=None, negative_ttl=NEGATIVE_TTL):
+        """Read the directory from disk and add commanders already scraped into `commanders_folder`."""
+        directory = cls(path, negative_ttl)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            directory.known.update(data.get("known", {}))
+            directory.missing.update(data.get("missing", {}))
+        except (OSError, ValueError):
+            pass
+
+        if commanders_folder and os.path.isdir(commanders_folder):
+            for folder in os.listdir(commanders_folder):
+                if folder.endswith(" (EDHREC)"):
+                    slug = folder[:-len(" (EDHREC)")]
+                    directory.known.setdefault(slug, slug)
+        return directory
+
+    def save(self):
+        """Write the directory back to disk if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                self._dirty = False
+                with open(tmp_path, "w", encoding="utf-8") as file:
+                    json.dump({"known": dict(self.known), "missing": dict(self.missing)}, file, indent=1, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                self._dirty = True
+                logging.warning(f"Could not save commander directory: {e}")
+
+    def add(self, commander_name):
+        """Register a commander name as a known EDHREC commander."""
+        slug = commander_slug(commander_name)
+        with self._lock:
+            if self.known.get(slug) != commander_name:
+                self.known[slug] = commander_name
+                self._dirty = True
+        return slug
+
+    def display_name(self, slug):
+        """Return the name a known commander was registered under, or the slug itself."""
+        with self._lock:
+            return self.known.get(slug, slug)
+
+    def __len__(self):
+        with self._lock:
+            return len(self.known)
+
+    def resolve(self, commander_name):
+        """Return the EDHREC slug for user input."""
+        return commander_slug(commander_name)
+
+    def closest(self, slug):
+        """Return the known slug closest to `slug`, or None if none is close enough.
+
+        Only meant as a fallback once EDHREC has no page for `slug` itself:
+        different commanders can be this close ("Omnath, Locus of Mana" and
+        "Omnath, Locus of Rage").
+        """
+        with self._lock:
+            candidates = [known for known in self.known if known != slug]
+        matches = difflib.get_close_matches(slug, candidates, n=1, cutoff=FUZZY_CUTOFF)
+        return matches[0] if matches else None
+
+    def is_missing(self, slug):
+        """Return True if the slug returned 404 within the negative-cache TTL."""
+        if not self.track:
+            return False
+        with self._lock:
+            seen = self.missing.get(slug)
+            if seen is None:
+                return False
+            if time.time() - seen >= self.negative_ttl:
+                del self.missing[slug]
+                self._dirty = True
+                return False
+            return True
+
+    def record_missing(self, slug):
+        """Remember that EDHREC has no average deck for this slug."""
+        if not self.track:
+            return
+        with self._lock:
+            self.missing[slug] = time.time()
+            self.known.pop(slug, None)
+            self._dirty = True
+
+    def record_found(self, slug, commander_name):
+        """Remember a slug that EDHREC served successfully."""
+        if not self.track:
+            return
+        with self._lock:
+            if self.missing.pop(slug, None) is not None:
+                self._dirty = True
+            if slug not in self.known or self.known[slug] == slug:
+                self.known[slug] = commander_name
+                self._dirty = True
@@ -0,0 +1,119 @@
+import csv
+import logging
+import os
+from collections import namedtuple
+
+from card_names import normalize_card_name
+from collection_index import parse_quantity
+from edhrec_urls import commander_slug
+
+DECK_FOLDER_SUFFIXES = (" (EDHREC)", " (Custom)")
+CUSTOM_DECKLIST_SUFFIX = ".txt"
+
+# A stored decklist: display name, folder its reports go to, and its merged cards (key -> [quantity, name])
+Deck = namedtuple("Deck", ["name", "folder", "cards"])
+
+
+def merge_deck_rows(rows):
+    """Merge decklist rows into {normalised key: [quantity, name]} so repeated lines count once."""
+    needed = {}
+    for row in rows:
+        if len(row) >= 2:
+            quantity, name = row[0], row[1]
+            key = normalize_card_name(name)
+            if key in needed:
+                needed[key][0] += parse_quantity(quantity)
+            else:
+                needed[key] = [parse_quantity(quantity), name]
+    return needed
+
+
+def read_custom_decklist(decklist_path):
+    """Return (commander name, rows) for a custom decklist text file.
+
+    The first line is the commander; every non-empty line is "<quantity> <name>".
+    """
+    with open(decklist_path, "r", encoding="utf-8") as file:
+        lines = file.readlines()
+    commander_name = lines[0].split(" ", 1)[1].strip()
+    rows = [line.strip().split(" ", 1) for line in lines if line.strip()]
+    return commander_name, rows
+
+
+def read_decklist_csv(csv_path):
+    """Return the Quantity/Name rows of a saved decklist CSV."""
+    with open(csv_path, mode="r", newline="", encoding="utf-8") as file:
+        reader = csv.reader(file)
+        next(reader, None)  # Skip header
+        return [row for row in reader if len(row) >= 2]
+
+
+def decklist_paths(commanders_folder, custom_folder):
+    """Return the decklist file of every stored deck: saved decks first, then the custom text files.
+
+    Report folders without a saved decklist CSV are left out: --all-decks and
+    --watch create a "(Custom)" folder for a text decklist without copying it.
+    """
+    paths = []
+    if os.path.isdir(commanders_folder):
+        for folder_name in sorted(os.listdir(commanders_folder)):
+            suffix = next((s for s in DECK_FOLDER_SUFFIXES if folder_name.endswith(s)), None)
+            if suffix is not None:
+                path = os.path.join(commanders_folder, folder_name, folder_name[:-len(suffix)] + ".csv")
+                if os.path.isfile(path):
+                    paths.append(path)
+    if os.path.isdir(custom_folder):
+        paths.extend(os.path.join(custom_folder, file_name) for file_name in sorted(os.listdir(custom_folder))
+                     if file_name.endswith(CUSTOM_DECKLIST_SUFFIX))
+    return paths
+
+
+def is_decklist_path(path, commanders_folder, custom_folder):
+    """Return True if `path` is where decklist_paths() would find a deck's decklist."""
+    folder, file_name = os.path.split(os.path.normpath(path))
+    if folder == os.path.normpath(custom_folder):
+        return file_name.endswith(CUSTOM_DECKLIST_SUFFIX)
+    parent, folder_name = os.path.split(folder)
+    slug, extension = os.path.splitext(file_name)
+    return (parent == os.path.normpath(commanders_folder) and extension == ".csv"
+            and any(folder_name == slug + suffix for suffix in DECK_FOLDER_SUFFIXES))
+
+
+def read_deck(decklist_path, commanders_folder):
+    """Read one file returned by decklist_paths() as a Deck."""
+    if decklist_path.endswith(CUSTOM_DECKLIST_SUFFIX):
+        commander_name, rows = read_custom_decklist(decklist_path)
+        folder_name = f"{commander_slug(commander_name)} (Custom)"
+        return Deck(folder_name, os.path.join(commanders_folder, folder_name), merge_deck_rows(rows))
+    folder = os.path.dirname(decklist_path)
+    return Deck(os.path.basename(folder), folder, merge_deck_rows(read_decklist_csv(decklist_path)))
+
+
+def load_decklists(commanders_folder, custom_folder):
+    """Load every stored decklist: saved decks under `commanders_folder` and the custom text files.
+
+    A custom text file takes precedence over the copy saved in its
+    "(Custom)" folder, since the text file is the one users edit.
+    """
+    decks = {}
+    for decklist_path in decklist_paths(commanders_folder, custom_folder):
+        try:
+            deck = read_deck(decklist_path, commanders_folder)
+        except (OSError, IndexError, UnicodeDecodeError) as e:
+            logging.warning(f"Skipping decklist {decklist_path}: {e}")
+            continue
+        decks[deck.name] = deck
+    return list(decks.values())
+
+
+def build_card_index(decks):
+    """Return the inverted index {normalised key: [(deck number, quantity), ...]} over all decks."""
+    card_index = {}
+    for number, deck in enumerate(decks):
+        for key, (quantity, _) in deck.cards.items():
+            users = card_index.get(key)
+            if users is None:
+                card_index[key] = [(number, quantity)]
+            else:
+                users.append((number, quantity))
+    return card_index
@@ -0,0 +1,205 @@
+import hashlib
+import heapq
+import logging
+import os
+import pickle
+import urllib.parse
+from array import array
+
+from card_vocabulary import bitset, iter_bits
+from collection_index import store_fingerprint
+from deck_library import merge_deck_rows, read_decklist_csv
+
+# Bump whenever the layout of the saved corpus changes so old files are rebuilt
+CORPUS_VERSION = 2
+DEFAULT_CORPUS_FILE = os.path.join(".cache", "deck_corpus.idx")
+DEFAULT_TOP_K = 20
+AVERAGE_DECKS_PATH = "/average-decks/"
+EDHREC_FOLDER_SUFFIX = " (EDHREC)"
+
+
+def cached_average_decks(cache, commanders_folder):
+    """Return {slug: rows} for every EDHREC average deck available locally.
+
+    Decks come from the HTTP response cache and from the (EDHREC) folders
+    under `commanders_folder`; the cache wins when both have a deck.
+    """
+    decks = {}
+    if os.path.isdir(commanders_folder):
+        for folder_name in os.listdir(commanders_folder):
+            if folder_name.endswith(EDHREC_FOLDER_SUFFIX):
+                slug = folder_name[:-len(EDHREC_FOLDER_SUFFIX)]
+                try:
+                    decks[slug] = read_decklist_csv(os.path.join(commanders_folder, folder_name, f"{slug}.csv"))
+                except OSError:
+                    pass
+    for entry in cache.entries():
+        path = urllib.parse.unquote(urllib.parse.urlsplit(entry.url).path)
+        if path.startswith(AVERAGE_DECKS_PATH) and entry.rows:
+            decks[path[len(AVERAGE_DECKS_PATH):].strip("/")] = entry.rows
+    return decks
+
+
+def sources_fingerprint(cache_folder, commanders_folder, card_store=None):
+    """Return a digest of the names, sizes and mtimes of every file the corpus is built from."""
+    paths = []
+    if os.path.isdir(cache_folder):
+        paths.extend(os.path.join(cache_folder, name) for name in os.listdir(cache_folder) if name.endswith(".json"))
+    if os.path.isdir(commanders_folder):
+        for folder_name in os.listdir(commanders_folder):
+            if folder_name.endswith(EDHREC_FOLDER_SUFFIX):
+                slug = folder_name[:-len(EDHREC_FOLDER_SUFFIX)]
+                paths.append(os.path.join(commanders_folder, folder_name, f"{slug}.csv"))
+
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    digest.update(repr(store_fingerprint(card_store)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class DeckCorpus:
+    """Every cached average deck as card IDs from the shared vocabulary.
+
+    Most cards appear once in a deck, so each deck keeps those as a bitset
+    (see card_vocabulary.bitset). The few cards needed more than once are
+    kept in compressed sparse row arrays: deck d needs
+    multi_quantities[i] copies of multi_indices[i] for i in
+    multi_indptr[d]:multi_indptr[d + 1]. Card prices from the offline card
+    store are resolved when the corpus is built. The corpus is saved under
+    .cache and rebuilt only when the HTTP cache, the saved decks, the card
+    store or the vocabulary change.
+    """
+
+    def __init__(self, vocabulary_token, deck_names, single_bits, multi_indptr, multi_indices, multi_quantities,
+                 totals, sizes, prices, fingerprint):
+        self.vocabulary_token = vocabulary_token
+        self.deck_names = deck_names  # deck number -> commander slug
+        self.single_bits = single_bits  # deck number -> bitset of cards needed once
+        self.multi_indptr = multi_indptr
+        self.multi_indices = multi_indices
+        self.multi_quantities = multi_quantities
+        self.totals = totals  # deck number -> total copies
+        self.sizes = sizes  # deck number -> distinct cards
+        self.prices = prices  # card ID -> cheapest USD price (0 when unknown)
+        self.fingerprint = fingerprint
+
+    def __len__(self):
+        return len(self.deck_names)
+
+    @classmethod
+    def build(cls, decks, vocabulary, card_store=None, fingerprint=None):
+        """Build a corpus from {deck name: rows}, interning new cards into `vocabulary`."""
+        deck_names, single_bits = [], []
+        multi_indptr, multi_indices, multi_quantities = array("I", [0]), array("I"), array("H")
+        totals, sizes = array("I"), array("I")
+        for deck_name, rows in sorted(decks.items()):
+            singles = []
+            total = 0
+            cards = merge_deck_rows(rows)
+            for key, (quantity, _) in cards.items():
+                card_id = vocabulary.intern(key)
+                total += quantity
+                if quantity == 1:
+                    singles.append(card_id)
+                else:
+                    multi_indices.append(card_id)
+                    multi_quantities.append(min(quantity, 0xFFFF))
+            deck_names.append(deck_name)
+            single_bits.append(bitset(singles))
+            multi_indptr.append(len(multi_indices))
+            totals.append(total)
+            sizes.append(len(cards))
+        vocabulary.save()
+
+        prices = array("d", bytes(8 * len(vocabulary)))
+        if card_store is not None:
+            for card_id, key in enumerate(vocabulary.keys):
+                prices[card_id] = card_store.price(key) or 0.0
+        return cls(vocabulary.token, deck_names, single_bits, multi_indptr, multi_indices, multi_quantities,
+                   totals, sizes, prices, fingerprint)
+
+    def save(self, path):
+        """Write the corpus to disk atomically."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump((CORPUS_VERSION, self.__dict__), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a saved corpus, or return None if it is missing or outdated."""
+        try:
+            with open(path, "rb") as file:
+                version, fields = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError, TypeError):
+            return None
+        if version != CORPUS_VERSION:
+            return None
+        corpus = cls.__new__(cls)
+        corpus.__dict__.update(fields)
+        return corpus
+
+    @classmethod
+    def open(cls, cache, commanders_folder, vocabulary, card_store=None, path=DEFAULT_CORPUS_FILE):
+        """Return the corpus of locally cached decks, rebuilding it only if its sources changed."""
+        fingerprint = sources_fingerprint(cache.folder, commanders_folder, card_store)
+        corpus = cls.load(path)
+        if (corpus is not None and corpus.fingerprint == fingerprint
+                and corpus.vocabulary_token == vocabulary.token and len(corpus.prices) <= len(vocabulary)):
+            return corpus
+
+        logging.info("Building deck corpus from cached EDHREC decks")
+        corpus = cls.build(cached_average_decks(cache, commanders_folder), vocabulary, card_store, fingerprint)
+        try:
+            corpus.save(path)
+        except OSError as e:
+            logging.warning(f"Could not save deck corpus: {e}")
+        return corpus
+
+    def rank(self, owned, k=DEFAULT_TOP_K, by="missing"):
+        """Return the top `k` decks as (slug, cards, coverage, missing copies, missing cost) tuples.
+
+        `owned` is the owned quantity of every card ID (collection_vector).
+        A deck's missing single cards are its bitset AND NOT the owned
+        bitset, counted with bit_count(); only multi-copy entries are checked
+        one by one. `by` is "missing" (fewest missing copies) or "cost"
+        (cheapest to complete); ties break on coverage. The best k are kept
+        with a heap.
+        """
+        owned_bits = bitset(card_id for card_id, quantity in enumerate(owned) if quantity)
+        by_cost = by == "cost"
+
+        def missing(deck, with_cost):
+            missing_bits = self.single_bits[deck] & ~owned_bits
+            copies = missing_bits.bit_count()
+            cost = sum(self.prices[card_id] for card_id in iter_bits(missing_bits)) if with_cost else 0.0
+            for i in range(self.multi_indptr[deck], self.multi_indptr[deck + 1]):
+                card_id = self.multi_indices[i]
+                shortage = max(0, self.multi_quantities[i] - (owned[card_id] if card_id < len(owned) else 0))
+                copies += shortage
+                cost += shortage * self.prices[card_id]
+            return copies, cost
+
+        def scores():
+            for deck in range(len(self.deck_names)):
+                copies, cost = missing(deck, by_cost)
+                total = self.totals[deck]
+                coverage = (total - copies) / total if total else 0.0
+                yield (cost if by_cost else copies), -coverage, deck, coverage
+
+        ranking = []
+        for _, _, deck, coverage in heapq.nsmallest(k, scores()):
+            copies, cost = missing(deck, True)  # Cost is only needed for the decks shown
+            ranking.append((self.deck_names[deck], self.sizes[deck], coverage, copies, cost))
+        return ranking
+
+
+def collection_vector(vocabulary, collection):
+    """Return the owned quantity of every card ID in the vocabulary as a uint32 array."""
+    return array("I", map(collection.count, vocabulary.keys))
@@ -0,0 +1,393 @@
+import codecs
+import html.parser
+import json
+import logging
+import re
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from edhrec_urls import EDHREC_BASE_URL, average_deck_url, commander_slug  # noqa: F401
+from fixtures import RecordingAdapter, ReplayAdapter
+
+REQUEST_TIMEOUT = 30  # Seconds to wait for EDHREC to answer
+USER_AGENT = "DeckMaster (+https://github.com/RiGraMa/deckMaster)"
+
+# Connection pool and retry settings for the shared session
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Bump when parse_decklist changes so cached parse results are redone
+PARSER_VERSION = 2
+
+# Next.js pages carry their data in <script id="__NEXT_DATA__" type="application/json">
+EMBEDDED_JSON_MARKER = b'id="__NEXT_DATA__"'
+CARD_LINE = re.compile(r"^(\d+)\s+(.+)$")
+CODE_TAG = b"<code"
+PARSE_CHUNK_SIZE = 64 * 1024  # Bytes fed to the streaming parser at a time
+STREAM_CHUNK_SIZE = 16 * 1024  # Bytes read from the network at a time in streaming mode
+
+
+class OfflineCacheMiss(requests.exceptions.RequestException):
+    """Raised in offline mode when a page is not in the response cache."""
+
+
+class RateLimitedSession(requests.Session):
+    """Session whose every request, retries and redirects included, goes through a shared TokenBucket.
+
+    Throttled and failing responses are retried here rather than inside
+    urllib3, so the limiter sees each one and can apply Retry-After and
+    slow down before the next attempt.
+    """
+
+    def __init__(self, limiter, max_retries=MAX_RETRIES):
+        super().__init__()
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    def send(self, request, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            response = super().send(request, **kwargs)
+            self.limiter.observe(response.status_code, response.headers.get("Retry-After"))
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            response.close()
+        return response
+
+
+def create_session(pool_maxsize=POOL_MAXSIZE, record_to=None, replay_from=None, limiter=None):
+    """Create a requests session with a pooled adapter and retries with backoff.
+
+    Reusing one session keeps TCP/TLS connections alive between commanders,
+    so batch runs only pay for the connection setup once per host. With
+    `record_to` every response is also saved as a fixture. With `replay_from`
+    responses come from recorded fixtures and the network is never used.
+    With a `limiter` (rate_limit.TokenBucket) every request waits for a token.
+    """
+    retries = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        # With a limiter, status retries happen in RateLimitedSession so they are rate limited too
+        status_forcelist=() if limiter is not None else RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    pool_settings = {"pool_connections": POOL_CONNECTIONS, "pool_maxsize": pool_maxsize, "max_retries": retries}
+    if replay_from:
+        adapter = ReplayAdapter(replay_from)
+    elif record_to:
+        adapter = RecordingAdapter(record_to, **pool_settings)
+    else:
+        adapter = HTTPAdapter(**pool_settings)
+
+    session = RateLimitedSession(limiter) if limiter is not None else requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def is_retryable(error):
+    """Return True if a failed fetch is worth trying again later."""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status in RETRY_STATUSES
+
+
+def _card_line_to_row(line):
+    """Split a "1 Sol Ring" style line into [quantity, name]."""
+    match = CARD_LINE.match(line.strip())
+    if match is None:
+        return None
+    return [match.group(1), match.group(2).strip()]
+
+
+def _find_decklist(node):
+    """Depth-first search of a JSON payload for the list of "N Card Name" entries."""
+    if isinstance(node, dict):
+        deck = node.get("deck")
+        if isinstance(deck, list) and deck and all(isinstance(line, str) for line in deck):
+            return deck
+        children = node.values()
+    elif isinstance(node, list):
+        if node and all(isinstance(line, str) and CARD_LINE.match(line) for line in node):
+            return node
+        children = node
+    else:
+        return None
+    for child in children:
+        found = _find_decklist(child)
+        if found is not None:
+            return found
+    return None
+
+
+def extract_embedded_json(page_content):
+    """Return the page's embedded __NEXT_DATA__ JSON payload, or None.
+
+    The payload is sliced straight out of the raw bytes, so no HTML tree is built.
+    """
+    if isinstance(page_content, str):
+        page_content = page_content.encode("utf-8")
+    marker = page_content.find(EMBEDDED_JSON_MARKER)
+    if marker == -1:
+        return None
+    start = page_content.find(b">", marker) + 1
+    end = page_content.find(b"</script>", start)
+    if start == 0 or end == -1:
+        return None
+    try:
+        return json.loads(page_content[start:end])
+    except ValueError:
+        return None
+
+
+def parse_embedded_decklist(page_content):
+    """Extract decklist rows from the page's embedded JSON payload, or None if it has none."""
+    payload = extract_embedded_json(page_content)
+    if payload is None:
+        return None
+    deck = _find_decklist(payload)
+    if deck is None:
+        return None
+    rows = [_card_line_to_row(line) for line in deck]
+    return [row for row in rows if row is not None] or None
+
+
+def _code_text_to_rows(content_text):
+    """Turn the text of the decklist's <code> element into [quantity, name] rows."""
+    # Remove double quotes and process the content
+    content_text = content_text.replace('"', '')
+    if len(content_text) > 1:
+        content_text = content_text[1:]
+
+    return [line.split(" ", 1) for line in content_text.splitlines() if line.strip()]
+
+
+def parse_code_decklist(page_content):
+    """Extract decklist rows from the page's <code> element using a full BeautifulSoup tree."""
+    from bs4 import BeautifulSoup  # Only this fallback needs bs4 and lxml, so they load on first use
+
+    # Parse the HTML content with BeautifulSoup
+    soup = BeautifulSoup(page_content, "lxml")
+
+    # Use a CSS selector to locate the decklist
+    content = soup.select("code")
+    if not content:
+        return None
+
+    # Extract the text from the first matching element
+    return _code_text_to_rows(content[0].get_text(strip=True))
+
+
+class DecklistHTMLParser(html.parser.HTMLParser):
+    """Streaming parser that keeps only the text of the first <code> element.
+
+    No tree is built: every other tag is skipped as it streams past, and
+    `done` is set as soon as the decklist element has closed so callers can
+    stop feeding the rest of the page.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._depth = 0
+        self._parts = []
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == "code" or self._depth:
+            self._depth += 1
+
+    def handle_endtag(self, tag):
+        if self._depth:
+            self._depth -= 1
+            if self._depth == 0:
+                self.done = True
+
+    def handle_data(self, data):
+        if self._depth and not self.done:
+            self._parts.append(data)
+
+    def rows(self):
+        """Return the decklist rows seen so far, or None if no <code> element closed."""
+        if not self.done:
+            return None
+        return _code_text_to_rows("".join(self._parts).strip())
+
+
+def parse_targeted_decklist(page_content, chunk_size=PARSE_CHUNK_SIZE):
+    """Extract decklist rows from the <code> element without building a tree.
+
+    Everything before the first <code> tag is skipped with a byte search;
+    from there the page is decoded and fed in chunks, and parsing stops once
+    the decklist has closed.
+    """
+    if isinstance(page_content, str):
+        page_content = page_content.encode("utf-8")
+    start = page_content.find(CODE_TAG)
+    if start == -1:
+        return None
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parser = DecklistHTMLParser()
+    view = memoryview(page_content)
+    for offset in range(start, len(view), chunk_size):
+        parser.feed(decoder.decode(view[offset:offset + chunk_size]))
+        if parser.done:
+            break
+    return parser.rows()
+
+
+def parse_decklist(page_content):
+    """Extract the decklist rows ([quantity, name]) from an average-deck page.
+
+    The embedded JSON payload is tried first; pages without it fall back to a
+    targeted parse of the <code> element. Returns None if the page has no decklist.
+    """
+    rows = parse_embedded_decklist(page_content)
+    if rows is None:
+        rows = parse_targeted_decklist(page_content)
+    return rows
+
+
+class StreamingDecklistExtractor:
+    """Incremental decklist extractor fed with raw response chunks.
+
+    A byte scan finds the first <code> tag, and the streaming <code> parser
+    runs from there. In parallel, a scan for the embedded JSON payload runs.
+    `feed` returns True as soon as either has a complete decklist, so the
+    rest of the download can be skipped.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._html = DecklistHTMLParser()
+        self._buffer = bytearray()
+        self._code_start = -1
+        self._json_start = -1
+        self._scan_from = 0
+        self.rows = None
+
+    @property
+    def body(self):
+        """The bytes received so far."""
+        return bytes(self._buffer)
+
+    def _find(self, needle, start):
+        """Search the buffer for `needle`, also catching matches split across chunks."""
+        return self._buffer.find(needle, max(start - len(needle) + 1, 0))
+
+    def feed(self, chunk):
+        """Add a chunk of the page; return True once the decklist is complete."""
+        if self.rows is not None:
+            return True
+        self._buffer += chunk
+
+        # Only hand bytes to the HTML parser from the first <code> tag onwards
+        if self._code_start == -1:
+            self._code_start = self._find(CODE_TAG, self._scan_from)
+            if self._code_start != -1:
+                chunk = self._buffer[self._code_start:]
+        if self._code_start != -1:
+            self._html.feed(self._decoder.decode(chunk))
+            if self._html.done:
+                self.rows = self._html.rows()
+                return True
+
+        # Look for the end of the embedded JSON script
+        if self._json_start == -1:
+            self._json_start = self._find(EMBEDDED_JSON_MARKER, self._scan_from)
+        if self._json_start != -1 and self._find(b"</script>", max(self._scan_from, self._json_start)) != -1:
+            self.rows = parse_embedded_decklist(self._buffer)
+            if self.rows is not None:
+                return True
+            self._json_start = len(self._buffer)  # Payload had no decklist; don't scan it again
+        self._scan_from = len(self._buffer)
+        return False
+
+    def finish(self):
+        """Return the rows found once the whole page has been fed (None if there was no decklist)."""
+        if self.rows is None and self._code_start != -1:
+            self._html.feed(self._decoder.decode(b"", final=True))
+            self.rows = self._html.rows()
+        return self.rows
+
+
+def _stream_decklist(response, chunk_size=STREAM_CHUNK_SIZE):
+    """Read a streamed response only until the decklist is complete.
+
+    Returns the rows, the bytes received and whether the download stopped
+    before the end of the page. The connection is closed early instead of
+    downloading the rest of the page.
+    """
+    extractor = StreamingDecklistExtractor()
+    partial = False
+    with response:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if extractor.feed(chunk):
+                partial = True
+                break
+    return extractor.finish(), extractor.body, partial
+
+
+def fetch_decklist(url, session=None, timeout=REQUEST_TIMEOUT, cache=None, offline=False, stream=False):
+    """Download an average-deck page and return its decklist rows (None if the page has none).
+
+    With a ResponseCache, pages younger than the cache TTL are served without
+    a request. Older ones are revalidated with If-None-Match/If-Modified-Since,
+    and a 304 answer reuses the cached parse result. In offline mode only the
+    cache is used. With `stream`, the body is read in chunks and the download
+    stops as soon as the decklist has been received.
+    """
+    entry = cache.get(url) if cache is not None else None
+    if entry is not None and entry.partial and entry.parser_version != PARSER_VERSION:
+        entry = None  # Only the start of the page was kept, so the new parser needs the whole page again
+
+    if entry is not None and (offline or entry.is_fresh(cache.ttl)):
+        logging.info(f"Using cached page for {url}")
+        return _cached_rows(cache, entry)
+    if offline:
+        raise OfflineCacheMiss(f"{url} is not in the cache (offline mode)")
+
+    http = session or requests
+    headers = entry.conditional_headers() if entry is not None else {}
+    response = http.get(url, headers=headers, timeout=timeout, stream=stream)
+
+    if response.status_code == 304 and entry is not None:
+        response.close()
+        logging.info(f"Page not modified since last fetch: {url}")
+        cache.refresh(entry)
+        return _cached_rows(cache, entry)
+
+    if stream:
+        try:
+            response.raise_for_status()  # Raise an exception for HTTP errors
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+        rows, body, partial = _stream_decklist(response)
+    else:
+        response.raise_for_status()  # Raise an exception for HTTP errors
+        body, partial = response.content, False
+        rows = parse_decklist(body)
+
+    if cache is not None:
+        cache.store(url, response, rows, PARSER_VERSION, body=body, partial=partial)
+    return rows
+
+
+def _cached_rows(cache, entry):
+    """Return an entry's parsed rows, re-parsing the stored body if the parser changed."""
+    if entry.parser_version == PARSER_VERSION:
+        return entry.rows
+    rows = parse_decklist(entry.body())
+    cache.refresh(entry, rows, PARSER_VERSION)
+    return rows
@@ -0,0 +1,34 @@
+import re
+import unicodedata
+import urllib.parse
+
+EDHREC_BASE_URL = "https://edhrec.com"
+PARTNER_SEPARATOR = re.compile(r"\s+[+&]\s+")
+FACE_SEPARATOR = "//"  # "Front // Back" is one double-faced card, not a partner pair
+
+
+def _name_slug(name):
+    """Slug for a single card name: accents folded, punctuation dropped, words joined by dashes."""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    name = name.replace(",", "").replace("'", "").replace("\u2019", "").lower()
+    return re.sub(r"[^a-z0-9]+", "-", name).strip("-")
+
+
+def commander_slug(commander_name):
+    """Turn a commander's name into the slug EDHREC uses in its URLs.
+
+    Partner pairs ("A + B" or "A & B") become both slugs in alphabetical
+    order, the way EDHREC lists them. A double-faced commander written with
+    both faces ("Front // Back") uses its front face, like EDHREC does.
+    """
+    parts = [part.split(FACE_SEPARATOR)[0] for part in PARTNER_SEPARATOR.split(commander_name)]
+    parts = [part for part in parts if part.strip()]
+    if len(parts) > 1:
+        return "-".join(sorted(_name_slug(part) for part in parts))
+    return _name_slug(parts[0]) if parts else ""
+
+
+def average_deck_url(slug, base_url=EDHREC_BASE_URL):
+    """Return the average-decks URL for a commander slug."""
+    return f"{base_url.rstrip('/')}/average-decks/{urllib.parse.quote(slug)}"
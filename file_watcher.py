@@ -0,0 +1,204 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import time
+
+DEBOUNCE_SECONDS = 0.5  # Wait for this much quiet after a change before reporting it
+MAX_DEBOUNCE_SECONDS = 5.0  # ...but never hold a steady stream of changes back longer than this
+POLL_INTERVAL = 1.0
+OVERFLOW = "*"  # Reported instead of paths when events were lost and everything must be rescanned
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000  # Linux values; os.O_CLOEXEC doesn't exist on Windows, where polling is used
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+EVENT_BUFFER_SIZE = 64 * 1024
+
+
+class InotifyWatcher:
+    """Reports changed files under a few folders using Linux inotify, called through ctypes.
+
+    Recursive folders get a watch per subfolder, added as subfolders appear.
+    Only paths accepted by `relevant` are reported, so writing reports next
+    to the watched decklists doesn't wake the watcher up.
+    """
+
+    def __init__(self, relevant=None):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+        self.relevant = relevant or (lambda path: True)
+        self._folders = {}  # watch descriptor -> (folder, recursive)
+        self._pending = {}  # folder that doesn't exist yet -> recursive
+
+    def watch(self, folder, recursive=False):
+        """Start reporting changes to the files in `folder` (and its subfolders if `recursive`)."""
+        folder = os.path.normpath(folder)
+        wd = self._add_watch(self._fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error not in (errno.ENOENT, errno.ENOTDIR):
+                raise OSError(error, f"Cannot watch {folder}: {os.strerror(error)}")
+            self._pending[folder] = recursive  # Picked up once it is created
+            return
+        self._pending.pop(folder, None)
+        self._folders[wd] = (folder, recursive)
+        if recursive:
+            for entry in os.scandir(folder):
+                if entry.is_dir(follow_symlinks=False):
+                    self.watch(entry.path, recursive=True)
+
+    def read(self, timeout=None):
+        """Return the set of relevant paths changed within `timeout` seconds (None waits for one)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed = set()
+        while not changed:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if self._pending:
+                remaining = POLL_INTERVAL if remaining is None else min(remaining, POLL_INTERVAL)
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            for folder, recursive in list(self._pending.items()):
+                if os.path.isdir(folder):
+                    self.watch(folder, recursive)
+                    changed.add(folder)
+            if ready:
+                changed |= self._read_events()
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        return changed
+
+    def _read_events(self):
+        changed = set()
+        try:
+            data = os.read(self._fd, EVENT_BUFFER_SIZE)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0"))
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                changed.add(OVERFLOW)
+                continue
+            if wd not in self._folders:
+                continue
+            folder, recursive = self._folders[wd]
+            if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                del self._folders[wd]
+                self._pending[folder] = recursive
+                changed.add(folder)
+                continue
+            path = os.path.join(folder, name)
+            if mask & IN_ISDIR:
+                if recursive:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self.watch(path, recursive=True)
+                    changed.add(path)  # Files may have come or gone with the folder
+            elif self.relevant(path):
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Fallback for platforms without inotify: compares file sizes and mtimes every `interval` seconds."""
+
+    def __init__(self, relevant=None, interval=POLL_INTERVAL):
+        self.relevant = relevant or (lambda path: True)
+        self.interval = interval
+        self._folders = {}  # folder -> recursive
+        self._snapshot = {}
+
+    def watch(self, folder, recursive=False):
+        """Start reporting changes to the files in `folder` (and its subfolders if `recursive`)."""
+        self._folders[os.path.normpath(folder)] = recursive
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        folders = list(self._folders.items())
+        while folders:
+            folder, recursive = folders.pop()
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            folders.append((entry.path, True))
+                    elif self.relevant(entry.path):
+                        stat = entry.stat()
+                        snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    continue  # Deleted while scanning
+        return snapshot
+
+    def read(self, timeout=None):
+        """Return the set of relevant paths changed within `timeout` seconds (None waits for one)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = self.interval if deadline is None else max(0.0, deadline - time.monotonic())
+            time.sleep(min(self.interval, remaining))
+            snapshot = self._scan()
+            changed = {path for path in snapshot.keys() | self._snapshot.keys()
+                       if snapshot.get(path) != self._snapshot.get(path)}
+            self._snapshot = snapshot
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        pass
+
+
+def create_watcher(relevant=None, poll=False):
+    """Return an InotifyWatcher, or a PollingWatcher if `poll` is set or inotify isn't available."""
+    if not poll:
+        try:
+            return InotifyWatcher(relevant)
+        except (OSError, AttributeError, TypeError) as e:  # Not Linux, or no libc to load
+            logging.info(f"inotify is not available ({e}); polling for changes instead.")
+    return PollingWatcher(relevant)
+
+
+def debounced_changes(watcher, quiet=DEBOUNCE_SECONDS, max_delay=MAX_DEBOUNCE_SECONDS):
+    """Yield sets of changed paths, merging each burst of changes into one set.
+
+    A burst ends after `quiet` seconds without changes, so a file saved in
+    several writes (or many files copied at once) is reported once.
+    """
+    while True:
+        changed = watcher.read()
+        deadline = time.monotonic() + max_delay
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            more = watcher.read(min(quiet, remaining))
+            if not more:
+                break
+            changed |= more
+        yield changed
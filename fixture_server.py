@@ -0,0 +1,139 @@
+"""Local stand-in for EDHREC that serves recorded average-deck pages.
+
+Usage:
+    python fixture_server.py FIXTURES_FOLDER [--port 8800] [--latency 0.2] [--jitter 0.1]
+                             [--error-rate 0.05] [--rate-limit 20] [--retry-after 1]
+
+Point DeckMaster at it with --base-url http://127.0.0.1:8800 to load-test the
+scraper, its retries and the concurrent engine on one machine.
+"""
+import argparse
+import logging
+import random
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fixtures import fixture_key, load_fixture, not_modified
+
+DEFAULT_PORT = 8800
+
+
+class RateWindow:
+    """Fixed one-second window counter used to answer 429 above a request rate."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._window = 0
+        self._count = 0
+
+    def allow(self):
+        if not self.limit:
+            return True
+        with self._lock:
+            window = int(time.monotonic())
+            if window != self._window:
+                self._window, self._count = window, 0
+            self._count += 1
+            return self._count <= self.limit
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    """Serves recorded pages with simulated latency, errors, 304s and rate limiting."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real site
+
+    def do_GET(self):
+        settings = self.server.settings
+        self._count("requests")
+
+        delay = settings.latency + random.uniform(0, settings.jitter)
+        if delay:
+            time.sleep(delay)
+
+        if not self.server.rate_window.allow():
+            self._count("429")
+            self._reply(429, b"Too Many Requests", {"Retry-After": str(settings.retry_after)})
+            return
+        if settings.error_rate and random.random() < settings.error_rate:
+            self._count("5xx")
+            self._reply(random.choice((500, 502, 503)), b"Simulated server error")
+            return
+
+        fixture = load_fixture(settings.folder, fixture_key(self.path))
+        if fixture is None:
+            self._count("404")
+            self._reply(404, b"Not recorded")
+            return
+
+        status, headers, body = fixture
+        if status == 200 and not_modified(self.headers, headers):
+            self._count("304")
+            self._reply(304, b"", {k: v for k, v in headers.items() if k in ("ETag", "Last-Modified")})
+            return
+        self._count(str(status))
+        self._reply(status, body, headers)
+
+    def _count(self, key):
+        stats = self.server.stats
+        with self.server.stats_lock:
+            stats[key] = stats.get(key, 0) + 1
+
+    def _reply(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            if name.lower() != "content-length":
+                self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} - {format % args}")
+
+
+def create_fixture_server(folder, port=DEFAULT_PORT, latency=0.0, jitter=0.0, error_rate=0.0,
+                          rate_limit=0, retry_after=1, host="127.0.0.1"):
+    """Create (but don't start) a fixture server; call serve_forever() on the result."""
+    server = ThreadingHTTPServer((host, port), FixtureRequestHandler)
+    server.daemon_threads = True
+    server.settings = argparse.Namespace(folder=folder, latency=latency, jitter=jitter, error_rate=error_rate,
+                                         retry_after=retry_after)
+    server.rate_window = RateWindow(rate_limit)
+    server.stats = {}
+    server.stats_lock = threading.Lock()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded EDHREC average-deck pages locally.")
+    parser.add_argument("folder", help="Folder of recorded pages (see --record in combo.py).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency of up to this many seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 5xx.")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Requests per second before answering 429 (0 = off).")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429 responses.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = create_fixture_server(args.folder, args.port, args.latency, args.jitter, args.error_rate,
+                                   args.rate_limit, args.retry_after)
+    logging.info(f"Serving {args.folder} on http://127.0.0.1:{args.port}")
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # Print the stats when stopped
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logging.info(f"Served {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
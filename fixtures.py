@@ -0,0 +1,138 @@
+import email.utils
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import urllib.parse
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Recorded pages are stored as <key>.html with a <key>.json sidecar for status and headers
+FIXTURE_SUFFIX = ".html"
+META_SUFFIX = ".json"
+RECORDED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+class FixtureMissingError(requests.exceptions.RequestException):
+    """Raised when replaying a URL that has no recording, instead of answering with a 404."""
+
+
+def fixture_key(url):
+    """Return the file name stem a URL is recorded under (the commander slug for average-deck pages)."""
+    path = urllib.parse.unquote(urllib.parse.urlsplit(url).path)
+    if path.startswith("/average-decks/"):
+        path = path[len("/average-decks/"):]
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", path.strip("/")) or "index"
+
+
+def fixture_etag(body):
+    """Strong ETag derived from a page body."""
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def save_fixture(folder, key, body, status=200, headers=None):
+    """Write a recorded response to `folder`."""
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, key + FIXTURE_SUFFIX), "wb") as file:
+        file.write(body)
+    recorded = {name.lower(): name for name in RECORDED_HEADERS}
+    meta = {"status": status,
+            "headers": {recorded[k.lower()]: v for k, v in (headers or {}).items() if k.lower() in recorded}}
+    with open(os.path.join(folder, key + META_SUFFIX), "w", encoding="utf-8") as file:
+        json.dump(meta, file, indent=1)
+
+
+def load_fixture(folder, key):
+    """Return (status, headers, body) for a recorded response, or None if there is no recording.
+
+    Pages saved by hand without a sidecar are served as 200 with an ETag and
+    Last-Modified derived from the file.
+    """
+    body_path = os.path.join(folder, key + FIXTURE_SUFFIX)
+    try:
+        with open(body_path, "rb") as file:
+            body = file.read()
+    except OSError:
+        return None
+
+    status, headers = 200, {}
+    try:
+        with open(os.path.join(folder, key + META_SUFFIX), "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        status, headers = meta.get("status", 200), meta.get("headers", {})
+    except (OSError, ValueError):
+        pass
+    headers.setdefault("Content-Type", "text/html; charset=utf-8")
+    headers.setdefault("ETag", fixture_etag(body))
+    headers.setdefault("Last-Modified", email.utils.formatdate(os.path.getmtime(body_path), usegmt=True))
+    return status, headers, body
+
+
+def not_modified(request_headers, headers):
+    """Return True if a conditional request matches the recorded validators."""
+    if_none_match = request_headers.get("If-None-Match")
+    if if_none_match is not None:
+        return if_none_match == headers.get("ETag")
+    if_modified_since = request_headers.get("If-Modified-Since")
+    if if_modified_since is not None and headers.get("Last-Modified"):
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+            modified = email.utils.parsedate_to_datetime(headers["Last-Modified"])
+        except (TypeError, ValueError):
+            return False
+        return modified <= since
+    return False
+
+
+class RecordingAdapter(HTTPAdapter):
+    """HTTP adapter that saves every successful response into a fixtures folder."""
+
+    def __init__(self, folder, **kwargs):
+        super().__init__(**kwargs)
+        self.folder = folder
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if response.status_code in (200, 404):
+            body = response.content  # Recording needs the whole body, even for streamed requests
+            save_fixture(self.folder, fixture_key(request.url), body, response.status_code, response.headers)
+            logging.info(f"Recorded {request.url} into {self.folder}")
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """HTTP adapter that answers from a fixtures folder instead of the network.
+
+    URLs without a recording raise FixtureMissingError, so a gap in the
+    fixtures isn't mistaken for an EDHREC 404. Conditional requests get a 304
+    when they match the recording's validators.
+    """
+
+    def __init__(self, folder):
+        super().__init__()
+        self.folder = folder
+
+    def send(self, request, **kwargs):
+        fixture = load_fixture(self.folder, fixture_key(request.url))
+        if fixture is None:
+            raise FixtureMissingError(f"No recording of {request.url} in {self.folder}", request=request)
+        status, headers, body = fixture
+        if status == 200 and not_modified(request.headers, headers):
+            status, body = 304, b""
+
+        response = requests.Response()
+        response.status_code = status
+        response.reason = {200: "OK", 304: "Not Modified", 404: "Not Found"}.get(status, "")
+        response.headers = CaseInsensitiveDict(headers)
+        response.raw = io.BytesIO(body)
+        response.url = request.url
+        response.request = request
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+    def close(self):
+        pass
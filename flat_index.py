@@ -0,0 +1,201 @@
+import bisect
+import mmap
+import os
+import struct
+from array import array
+
+from card_names import normalize_card_name
+from card_store import key_hash
+from collection_index import file_fingerprint, store_fingerprint
+from fuzzy_index import TrigramSearch
+
+FLAT_MAGIC = b"DMFI"
+FLAT_VERSION = 2
+ORACLE_PREFIX = "oracle:"
+
+# Header: magic, version, key count, CSV mtime and size, card store mtime and size (-1 without a store),
+# SHA-256 of the CSV, then the sizes of the suggestion sections: entries, terms, trigrams,
+# bytes of names, bytes of term keys and postings
+HEADER = struct.Struct("<4sIQqqqq32s6Q")
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _layout(count, entries, terms, grams, names_length, keys_length, postings):
+    """Return {section: (offset, length in bytes, item format)} for the file's sections, in file order."""
+    sections = [
+        ("hashes", 8 * count, "Q"),  # Sorted key hashes
+        ("quantities", 4 * count, "I"),  # Owned quantity per key hash
+        ("name_offsets", 4 * (entries + 1), "I"),  # Entry number -> start of its name in "names"
+        ("names", names_length, "B"),  # UTF-8 names of the owned cards
+        ("key_offsets", 4 * (terms + 1), "I"),  # Term number -> start of its key in "keys"
+        ("keys", keys_length, "B"),  # UTF-8 normalised name keys of the trigram index
+        ("term_entries", 4 * terms, "I"),  # Term number -> entry number
+        ("term_sizes", 2 * terms, "H"),  # Term number -> trigram count
+        ("gram_hashes", 8 * grams, "Q"),  # Sorted trigram hashes
+        ("posting_offsets", 4 * (grams + 1), "I"),  # Trigram number -> start of its terms in "postings"
+        ("postings", 4 * postings, "I"),  # Term numbers, grouped by trigram
+    ]
+    layout, offset = {}, _align(HEADER.size)
+    for name, length, item_format in sections:
+        layout[name] = (offset, length, item_format)
+        offset = _align(offset + length)
+    return layout
+
+
+def _string_table(strings):
+    """Return (offsets, UTF-8 data) for a list of strings; string i is data[offsets[i]:offsets[i + 1]]."""
+    offsets, data = array("I", [0]), bytearray()
+    for string in strings:
+        data += string.encode("utf-8")
+        offsets.append(len(data))
+    return offsets, bytes(data)
+
+
+class _FlatTrigramIndex(TrigramSearch):
+    """TrigramIndex searched in place in the mapped file: sorted trigram hashes with their postings."""
+
+    def __init__(self, sections):
+        self._sections = sections
+        self.sizes = sections["term_sizes"]
+
+    def _posting(self, gram):
+        gram_hashes = self._sections["gram_hashes"]
+        target = key_hash(gram)
+        index = bisect.bisect_left(gram_hashes, target)
+        if index == len(gram_hashes) or gram_hashes[index] != target:
+            return ()
+        offsets = self._sections["posting_offsets"]
+        return self._sections["postings"][offsets[index]:offsets[index + 1]]
+
+    def _term(self, term):
+        offsets = self._sections["key_offsets"]
+        key = bytes(self._sections["keys"][offsets[term]:offsets[term + 1]]).decode("utf-8")
+        return key, self._sections["term_entries"][term]
+
+
+class FlatCollectionIndex:
+    """Read-only collection index laid out flat in a memory-mapped file, for worker processes.
+
+    The file holds a sorted array of 64-bit key hashes and a parallel array
+    of uint32 quantities. Name keys and "oracle:<id>" keys from the
+    CollectionIndex are both stored. The exported names and the trigram index
+    used by suggest() are flat too: string tables, sorted trigram hashes and
+    a postings array. Workers map the file and search it in place, so
+    attaching costs no unpickling or copying. Every process shares the same
+    page-cache pages, so memory stays flat as the pool grows.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, self.mtime_ns, self.size, store_mtime_ns, store_size, sha256, *sizes = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != FLAT_MAGIC or version != FLAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a flat collection index of version {FLAT_VERSION}")
+        self.sha256 = sha256.hex()
+        self.store_fingerprint = None if store_mtime_ns < 0 else (store_mtime_ns, store_size)
+        view = memoryview(self._mm)
+        self._sections = {name: view[offset:offset + length].cast(item_format)
+                          for name, (offset, length, item_format) in _layout(count, *sizes).items()}
+        self._hashes = self._sections["hashes"]
+        self._quantities = self._sections["quantities"]
+        self._fuzzy = _FlatTrigramIndex(self._sections)
+
+    @classmethod
+    def publish(cls, collection, path):
+        """Write a CollectionIndex to `path` in the flat layout (atomically) and return it mapped."""
+        table = {}
+        for key, entry in collection.keys.items():
+            table[key_hash(key)] = collection.quantities[entry]
+        for oracle_id, entry in collection.oracles.items():
+            table[key_hash(ORACLE_PREFIX + oracle_id)] = collection.quantities[entry]
+        hashes = sorted(table)
+
+        fuzzy = collection.fuzzy
+        name_offsets, names = _string_table(collection.names)
+        key_offsets, keys = _string_table(key for key, _ in fuzzy.terms)
+        grams = sorted((key_hash(gram), posting) for gram, posting in fuzzy.postings.items())
+        posting_offsets, postings = array("I", [0]), array("I")
+        for _, posting in grams:
+            postings.extend(posting)
+            posting_offsets.append(len(postings))
+
+        data = {
+            "hashes": array("Q", hashes),
+            "quantities": array("I", (min(table[h], 0xFFFFFFFF) for h in hashes)),
+            "name_offsets": name_offsets,
+            "names": names,
+            "key_offsets": key_offsets,
+            "keys": keys,
+            "term_entries": array("I", (entry for _, entry in fuzzy.terms)),
+            "term_sizes": array("H", fuzzy.sizes),
+            "gram_hashes": array("Q", (gram_hash for gram_hash, _ in grams)),
+            "posting_offsets": posting_offsets,
+            "postings": postings,
+        }
+        sizes = (len(collection.names), len(fuzzy.terms), len(grams), len(names), len(keys), len(postings))
+        layout = _layout(len(hashes), *sizes)
+
+        store_mtime_ns, store_size = collection.store_fingerprint or (-1, -1)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(HEADER.pack(FLAT_MAGIC, FLAT_VERSION, len(hashes), collection.mtime_ns, collection.size,
+                                   store_mtime_ns, store_size, bytes.fromhex(collection.sha256), *sizes))
+            for name, (offset, _, _) in layout.items():
+                file.write(b"\0" * (offset - file.tell()))
+                file.write(bytes(data[name]))
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    @classmethod
+    def attach(cls, path):
+        """Map an index published by another process."""
+        return cls(path)
+
+    def close(self):
+        self._fuzzy = None
+        for section in self._sections.values():
+            section.release()
+        self._mm.close()
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def _lookup(self, key):
+        target = key_hash(key)
+        index = bisect.bisect_left(self._hashes, target)
+        if index < len(self._hashes) and self._hashes[index] == target:
+            return self._quantities[index]
+        return 0
+
+    def __contains__(self, card_name):
+        return self._lookup(normalize_card_name(card_name)) > 0
+
+    def count(self, key):
+        """Return the owned quantity for an already normalised name key."""
+        return self._lookup(key)
+
+    def count_oracle(self, oracle_id):
+        """Return the owned quantity of every printing of the card with this oracle ID."""
+        return self._lookup(ORACLE_PREFIX + oracle_id)
+
+    def quantity(self, card_name):
+        """Return how many copies of a card are owned, over all printings."""
+        return self._lookup(normalize_card_name(card_name))
+
+    def suggest(self, key):
+        """Return the exported names of owned cards close to an unmatched name key, best first."""
+        offsets, names = self._sections["name_offsets"], self._sections["names"]
+        return [bytes(names[offsets[entry]:offsets[entry + 1]]).decode("utf-8")
+                for entry, _ in self._fuzzy.search(key)]
+
+    def is_current(self, csv_path, card_store=None):
+        """Return True if the CSV and card store still have the mtime and size this index was built from."""
+        return (file_fingerprint(csv_path) == (self.mtime_ns, self.size)
+                and store_fingerprint(card_store) == self.store_fingerprint)
@@ -0,0 +1,91 @@
+import difflib
+import heapq
+from array import array
+
+CANDIDATE_THRESHOLD = 0.4  # Minimum trigram overlap (Dice coefficient) to be scored at all
+MAX_CANDIDATES = 10
+FUZZY_THRESHOLD = 0.8  # Minimum edit similarity for a suggestion
+MAX_SUGGESTIONS = 3
+
+
+def trigrams(key):
+    """Return the set of character trigrams of a normalised name, padded so word edges count."""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramSearch:
+    """Near-miss search shared by the trigram indexes.
+
+    Subclasses provide `sizes` (term number -> trigram count), `_posting(gram)`
+    (term numbers containing a trigram) and `_term(term)` ((normalised name,
+    entry number)).
+    """
+
+    def search(self, key, threshold=FUZZY_THRESHOLD, limit=MAX_SUGGESTIONS):
+        """Return up to `limit` (entry, score) pairs for names similar to `key`, best first.
+
+        Trigram overlap picks a handful of candidates; only those are scored
+        with difflib, which also catches the transposed letters that trigrams
+        punish on short names. Faces of the same card collapse to one result.
+        """
+        grams = trigrams(key)
+        shared = {}
+        for gram in grams:
+            for term in self._posting(gram):
+                shared[term] = shared.get(term, 0) + 1
+
+        # Dice coefficient: 2 * |A & B| / (|A| + |B|)
+        size = len(grams)
+        minimum = CANDIDATE_THRESHOLD * size / 2  # Fewer shared trigrams can never reach the threshold
+        candidates = heapq.nlargest(
+            MAX_CANDIDATES,
+            ((2 * count / (size + self.sizes[term]), term) for term, count in shared.items() if count >= minimum))
+
+        best = {}
+        matcher = difflib.SequenceMatcher(b=key, autojunk=False)
+        for dice, term in candidates:
+            if dice < CANDIDATE_THRESHOLD:
+                continue
+            name, entry = self._term(term)
+            matcher.set_seq1(name)
+            score = matcher.ratio()
+            if score >= threshold and score > best.get(entry, 0):
+                best[entry] = score
+        return sorted(best.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+class TrigramIndex(TrigramSearch):
+    """Inverted index from character trigrams to normalised card names, for near-miss lookups.
+
+    A query only touches the posting lists of its own trigrams, so it costs
+    far less than comparing against every name in the collection. It is built
+    together with the collection index and saved inside it.
+    """
+
+    def __init__(self, terms, sizes, postings):
+        self.terms = terms  # term number -> (normalised name, entry number)
+        self.sizes = sizes  # term number -> trigram count
+        self.postings = postings  # trigram -> array of term numbers
+
+    @classmethod
+    def build(cls, keys):
+        """Index a mapping of normalised name -> entry number."""
+        terms, sizes, postings = [], array("H"), {}
+        for key, entry in keys.items():
+            grams = trigrams(key)
+            term = len(terms)
+            terms.append((key, entry))
+            sizes.append(min(len(grams), 0xFFFF))
+            for gram in grams:
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array("I")
+                posting.append(term)
+        return cls(terms, sizes, postings)
+
+    def _posting(self, gram):
+        return self.postings.get(gram, ())
+
+    def _term(self, term):
+        return self.terms[term]
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import logging
+import os
+import time
+import zlib
+
+DEFAULT_CACHE_FOLDER = os.path.join(".cache", "http")
+DEFAULT_TTL = 12 * 60 * 60  # Seconds before a cached page is revalidated
+
+
+class CacheEntry:
+    """A cached response: validators, compressed body and the rows parsed from it."""
+
+    def __init__(self, meta, cache):
+        self.meta = meta
+        self._cache = cache
+
+    @property
+    def url(self):
+        return self.meta["url"]
+
+    @property
+    def rows(self):
+        return self.meta.get("rows")
+
+    @property
+    def parser_version(self):
+        return self.meta.get("parser_version")
+
+    @property
+    def partial(self):
+        """True if the body stops where a streamed download was cut off, so it can't be re-parsed."""
+        return self.meta.get("partial", False)
+
+    def age(self):
+        """Seconds since the entry was last fetched or revalidated."""
+        return time.time() - self.meta["checked_at"]
+
+    def is_fresh(self, ttl):
+        return self.age() < ttl
+
+    def body(self):
+        """Return the decompressed response body."""
+        with open(self._cache.body_path(self.url), "rb") as file:
+            return zlib.decompress(file.read())
+
+    def conditional_headers(self):
+        """Headers asking the server to answer 304 if the page is unchanged."""
+        headers = {}
+        if self.meta.get("etag"):
+            headers["If-None-Match"] = self.meta["etag"]
+        if self.meta.get("last_modified"):
+            headers["If-Modified-Since"] = self.meta["last_modified"]
+        return headers
+
+
+class ResponseCache:
+    """On-disk cache of HTTP responses keyed by URL.
+
+    Each entry keeps the zlib-compressed body, the ETag/Last-Modified
+    validators and the decklist rows parsed from the body, so a 304 answer
+    can skip both the download and the parse.
+    """
+
+    def __init__(self, folder=DEFAULT_CACHE_FOLDER, ttl=DEFAULT_TTL):
+        self.folder = folder
+        self.ttl = ttl
+
+    def _key(self, url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def meta_path(self, url):
+        return os.path.join(self.folder, f"{self._key(url)}.json")
+
+    def body_path(self, url):
+        return os.path.join(self.folder, f"{self._key(url)}.body.z")
+
+    def get(self, url):
+        """Return the CacheEntry for a URL, or None if nothing usable is cached."""
+        try:
+            with open(self.meta_path(url), "r", encoding="utf-8") as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != url or not os.path.isfile(self.body_path(url)):
+            return None
+        return CacheEntry(meta, self)
+
+    def entries(self):
+        """Yield every usable entry in the cache folder."""
+        try:
+            files = os.listdir(self.folder)
+        except OSError:
+            return
+        for file_name in files:
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.folder, file_name), "r", encoding="utf-8") as file:
+                    meta = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if "url" in meta:
+                yield CacheEntry(meta, self)
+
+    def store(self, url, response, rows, parser_version, body=None, partial=False):
+        """Save a 200 response and the rows parsed from it.
+
+        `body` overrides response.content, e.g. for a streamed download that
+        stopped once the decklist was received; pass `partial` in that case,
+        since the validators still describe the whole page.
+        """
+        if body is None:
+            body = response.content
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "checked_at": time.time(),
+            "rows": rows,
+            "parser_version": parser_version,
+            "partial": partial,
+        }
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            self._write(self.body_path(url), zlib.compress(body, 6))
+            self._write(self.meta_path(url), json.dumps(meta).encode("utf-8"))
+        except OSError as e:
+            logging.warning(f"Could not write HTTP cache entry for {url}: {e}")
+
+    def refresh(self, entry, rows=None, parser_version=None):
+        """Mark an entry as just revalidated, optionally replacing its parsed rows."""
+        entry.meta["checked_at"] = time.time()
+        if rows is not None:
+            entry.meta["rows"] = rows
+            entry.meta["parser_version"] = parser_version
+        try:
+            self._write(self.meta_path(entry.url), json.dumps(entry.meta).encode("utf-8"))
+        except OSError as e:
+            logging.warning(f"Could not update HTTP cache entry for {entry.url}: {e}")
+
+    @staticmethod
+    def _write(path, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
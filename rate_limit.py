@@ -0,0 +1,91 @@
+import logging
+import random
+import threading
+import time
+
+DEFAULT_RATE = 4.0  # Requests per second
+MIN_RATE = 0.2
+RATE_INCREASE = 0.05  # Fraction of the target rate regained after each successful response
+MAX_RETRY_AFTER = 300  # Never wait longer than this on a Retry-After header
+THROTTLE_STATUSES = (429, 503)
+ERROR_STATUSES = (500, 502, 504)
+
+# Requeue settings for commanders whose fetch failed with a retryable error
+MAX_REQUEUES = 3
+REQUEUE_BASE_DELAY = 2.0  # Seconds, doubled for each requeue round
+DEFAULT_DEADLINE = 15 * 60  # Seconds for a whole batch, requeues included
+
+
+def parse_retry_after(value):
+    """Return the delay in seconds asked for by a Retry-After header, or None."""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        import email.utils  # HTTP dates are rare here, and email is slow to import
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+def backoff_delay(attempt, base=REQUEUE_BASE_DELAY):
+    """Exponential backoff with full jitter for the given (1-based) retry attempt."""
+    return random.uniform(0, base * 2 ** (attempt - 1))
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every request DeckMaster sends.
+
+    The rate adapts to the server: throttling (429/503) halves it and
+    other 5xx responses cut it by a quarter. A Retry-After header pauses all
+    requests for that long. Each successful response wins back a little of
+    the target rate (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=None, min_rate=MIN_RATE):
+        self.target_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def observe(self, status, retry_after=None):
+        """Adjust the rate to a response's status code and Retry-After header."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if status in THROTTLE_STATUSES or status in ERROR_STATUSES:
+                factor = 0.5 if status in THROTTLE_STATUSES else 0.75
+                self.rate = max(self.min_rate, self.rate * factor)
+                pause = parse_retry_after(retry_after)
+                if pause is None:
+                    pause = 1 / self.rate
+                self._paused_until = max(self._paused_until, now + pause)
+                self._tokens = 0
+                logging.warning(f"Server answered {status}; pausing {pause:.1f}s and slowing to {self.rate:.2f} req/s")
+            elif status < 400 and self.rate < self.target_rate:
+                self.rate = min(self.target_rate, self.rate + self.target_rate * RATE_INCREASE)
@@ -0,0 +1,114 @@
+"""Local DeckMaster service: a long-running process that keeps caches warm behind a JSON API.
+
+Start it with `python combo.py --serve`. While it runs, `--commander` and
+`--custom` calls from the same folder are forwarded to it (see
+service_client) instead of starting the work from scratch.
+
+    GET  /health                      -> {"status": "ok", "cwd": ..., "pid": ...}
+    POST /commander {"name": "..."}   -> result of scraping and comparing a commander
+    POST /custom    {"path": "..."}   -> result of processing a decklist in the custom decklist folder
+
+POST bodies must be sent as application/json.
+"""
+import json
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from service_client import DEFAULT_SERVICE_PORT, SERVICE_HOST
+
+MAX_REQUEST_SIZE = 1 << 20
+
+
+class SingleFlight:
+    """Merges concurrent calls for the same key into one execution.
+
+    The first caller runs the function; callers that arrive while it is
+    running wait for it and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> [event, result, error]
+
+    def do(self, key, function):
+        """Return function()'s result, sharing one call among concurrent callers with the same key."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = [threading.Event(), None, None]
+        if not leader:
+            logging.info(f"Joining the request already in flight for {key!r}")
+            call[0].wait()
+        else:
+            try:
+                call[1] = function()
+            except Exception as e:
+                call[2] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call[0].set()
+        if call[2] is not None:
+            raise call[2]
+        return call[1]
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """Dispatches POST /<operation> to the service's operations with the JSON body as argument."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, {"status": "ok", "cwd": os.getcwd(), "pid": os.getpid(),
+                              "operations": sorted(self.server.operations)})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        operation = self.server.operations.get(self.path.strip("/"))
+        if operation is None:
+            self._reply(404, {"error": "unknown operation"})
+            return
+        # Browsers send text/plain and form posts without a CORS preflight, so web pages could trigger those
+        if self.headers.get_content_type() != "application/json":
+            self.close_connection = True  # The body is left unread
+            self._reply(415, {"error": "Content-Type must be application/json"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length > MAX_REQUEST_SIZE:
+                raise ValueError("request too large")
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._reply(400, {"error": f"invalid request: {e}"})
+            return
+        try:
+            self._reply(200, operation(payload))
+        except (KeyError, TypeError, ValueError) as e:
+            self._reply(400, {"error": f"invalid request: {e}"})
+        except Exception as e:
+            logging.exception(f"Service operation {self.path} failed")
+            self._reply(500, {"error": str(e)})
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} - {format % args}")
+
+
+def create_service(operations, port=DEFAULT_SERVICE_PORT, host=SERVICE_HOST):
+    """Create (but don't start) the service; `operations` maps names to callables taking the JSON payload."""
+    server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    server.daemon_threads = True
+    server.operations = operations
+    return server
@@ -0,0 +1,44 @@
+import json
+import os
+import socket
+
+DEFAULT_SERVICE_PORT = 8766
+SERVICE_HOST = "127.0.0.1"
+PROBE_TIMEOUT = 0.25  # Seconds to wait when checking whether a service is running
+
+
+def find_service(port=DEFAULT_SERVICE_PORT):
+    """Return the health info of a service running for this folder, or None."""
+    try:
+        socket.create_connection((SERVICE_HOST, port), timeout=PROBE_TIMEOUT).close()
+    except OSError:
+        return None  # Nothing is listening
+
+    import urllib.request  # Pulls in http.client and ssl, so only loaded once something is listening
+    try:
+        with urllib.request.urlopen(f"http://{SERVICE_HOST}:{port}/health", timeout=PROBE_TIMEOUT) as response:
+            health = json.load(response)
+    except (OSError, ValueError):
+        return None
+    # The service writes reports relative to its own folder, so only use one started here
+    if health.get("status") != "ok" or os.path.realpath(health.get("cwd", "")) != os.path.realpath(os.getcwd()):
+        return None
+    return health
+
+
+def call_service(operation, payload, port=DEFAULT_SERVICE_PORT, timeout=None):
+    """POST an operation to the service and return its JSON result."""
+    import urllib.error
+    import urllib.request
+    request = urllib.request.Request(f"http://{SERVICE_HOST}:{port}/{operation}",
+                                     data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        try:
+            error = json.load(e).get("error", e.reason)
+        except ValueError:
+            error = e.reason
+        raise RuntimeError(f"DeckMaster service error: {error}") from None